@@ -0,0 +1,430 @@
+"""Benchmarks for the report pipeline.
+
+Runs offline on synthetic semgrep output, so semgrep does not need to be
+installed:
+
+    python benchmark.py pipeline --sizes 100,1000,10000,100000
+    python benchmark.py pipeline --json baseline.json
+    python benchmark.py pipeline --compare baseline.json
+    python benchmark.py layout --count 10000
+    python benchmark.py memory --count 100000
+    python benchmark.py synthetic --count 5000 --output scan.json
+    python benchmark.py startup --max-import-ms 150
+    python benchmark.py wrap --sizes 1024,10240,102400
+    python benchmark.py size --count 5000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import generate
+import report_pdf
+
+
+# Build a semgrep-shaped JSON document with `count` synthetic results
+def make_synthetic_scan(count, seed=1, rules=37, message_words=(10, 40, 120), code_lines=(1, 2, 6),
+                        reference_segments=(1, 3, 12)):
+    """Synthetic semgrep output.
+
+    Each tuple parameter lists the sizes picked from at random: words per
+    rule message, lines of `extra.lines` per result and path segments per
+    reference URL.
+    """
+    rng = random.Random(seed)
+    words = ("user input passed directly into a dangerous sink without validation may allow "
+             "attackers to execute arbitrary code sanitize the value before use").split()
+    severities = ("ERROR", "WARNING", "INFO")
+    confidences = ("HIGH", "MEDIUM", "LOW")
+
+    # Semgrep repeats the same message for every hit of a rule
+    messages = [" ".join(rng.choice(words) for _ in range(rng.choice(message_words))) for _ in range(rules)]
+
+    results = []
+    for i in range(count):
+        message = messages[i % rules]
+        code = "\n".join(f"    result_{j} = subprocess.call(cmd_{j}, shell=True)" for j in range(rng.choice(code_lines)))
+        results.append({
+            "check_id": f"python.lang.security.audit.rule-{i % rules}.dangerous-subprocess-use-tainted-env-args",
+            "path": f"src/module_{i % 50}/handlers/file_{i}.py",
+            "start": {"line": i + 1},
+            "end": {"line": i + 3},
+            "extra": {
+                "message": message,
+                "severity": severities[i % 3],
+                "lines": code,
+                "metadata": {
+                    "cwe": ["CWE-78: Improper Neutralization of Special Elements used in an OS Command"],
+                    "impact": "HIGH",
+                    "confidence": confidences[i % 7 % 3],
+                    "references": ["https://example.com/" + "reference-segment/" * rng.choice(reference_segments)],
+                },
+            },
+        })
+    return {"version": "synthetic", "results": results, "errors": []}
+
+# Parse a comma separated list of integers ("1,3,12")
+def int_list(value):
+    return tuple(int(part) for part in value.split(','))
+
+# Run one pipeline stage, returning its result and elapsed seconds (and peak MiB when traced)
+def run_stage(function, traced):
+    gc.collect()
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = None
+    if traced:
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, seconds, peak
+
+# Time each pipeline stage and record its peak memory at every size
+def bench_pipeline(sizes, generator_options, memory=True):
+    """Return {size: {stage: {'seconds': s, 'peak_mib': m}}}"""
+    report = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            text = json.dumps(make_synthetic_scan(size, **generator_options))
+            filename = os.path.join(workdir, f"bench-{size}.pdf")
+
+            def stages():
+                # Each stage takes the previous stage's output, as in generate.py
+                scan_data = yield "json.loads", lambda: json.loads(text)
+                lists = yield "categorize_finding", lambda: generate.categorize_finding(scan_data)
+                yield "store_finding", lambda: generate.store_finding(*lists, scan_data)
+                high, medium, low = yield "build_findings", lambda: generate.build_findings(scan_data)
+                yield "generate_pdf_report", lambda: generate.generate_pdf_report(
+                    high, medium, low, filename, "benchmark", len(scan_data['results']))
+
+            results = {}
+            # Timings come from an untraced pass; tracemalloc slows allocation-heavy code down
+            for traced in ((False, True) if memory else (False,)):
+                pipeline = stages()
+                name, function = next(pipeline)
+                while True:
+                    output, seconds, peak = run_stage(function, traced)
+                    entry = results.setdefault(name, {})
+                    if traced:
+                        entry['peak_mib'] = round(peak, 2)
+                    else:
+                        entry['seconds'] = round(seconds, 4)
+                    try:
+                        name, function = pipeline.send(output)
+                    except StopIteration:
+                        break
+
+            results['generate_pdf_report']['pdf_mib'] = round(os.path.getsize(filename) / 2**20, 2)
+            report[size] = results
+            print_pipeline_results(size, results)
+    return report
+
+def print_pipeline_results(size, results):
+    print(f"\n{size} findings")
+    for stage, entry in results.items():
+        peak = f"  peak {entry['peak_mib']:8.1f} MiB" if 'peak_mib' in entry else ""
+        per_finding = entry['seconds'] / size * 1000
+        print(f"  {stage:<20} {entry['seconds']:8.3f}s  ({per_finding:.4f} ms/finding){peak}")
+
+# Compare stage timings against a saved run; returns the list of regressions
+def compare_pipeline(report, baseline, tolerance, min_seconds=0.05):
+    regressions = []
+    for size, stages in report.items():
+        for stage, entry in stages.items():
+            previous = baseline.get(str(size), {}).get(stage)
+            if not previous or max(previous['seconds'], entry['seconds']) < min_seconds:
+                continue  # Too fast to compare reliably
+            if entry['seconds'] > previous['seconds'] * (1 + tolerance):
+                regressions.append(f"{stage} at {size} findings: {previous['seconds']:.3f}s -> {entry['seconds']:.3f}s")
+    return regressions
+
+# Time the layout stage and the drawing stage per finding
+def bench_layout(count):
+    scan_data = make_synthetic_scan(count)
+    high, medium, low = generate.build_findings(scan_data)
+    findings = [(finding, "High") for finding in high] + [(finding, "Medium") for finding in medium] + \
+               [(finding, "Low") for finding in low]
+
+    pdf = report_pdf.PDF()
+    pdf.add_page()
+
+    start = time.perf_counter()
+    layouts = [pdf.layout_finding(finding, level) for finding, level in findings]
+    layout_seconds = time.perf_counter() - start
+
+    # A fresh document so the render pass can't reuse the layout pass's caches
+    pdf = report_pdf.PDF()
+    pdf.add_page()
+    start = time.perf_counter()
+    for level, section in (("High", high), ("Medium", medium), ("Low", low)):
+        pdf.write_to_table(section, level)
+    render_seconds = time.perf_counter() - start
+
+    print(f"Findings:        {len(layouts)}")
+    print(f"Pages:           {pdf.page_no()}")
+    print(f"Layout only:     {layout_seconds:.2f}s ({layout_seconds / count * 1000:.3f} ms/finding)")
+    print(f"Layout + render: {render_seconds:.2f}s ({render_seconds / count * 1000:.3f} ms/finding)")
+
+class TextReader:
+    """File-like view of a string that hands out chunks without copying it first (unlike io.StringIO)"""
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def read(self, size):
+        chunk = self.text[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+# Compare the memory of the list-based findings path with the compact one-pass builder
+def bench_memory(count):
+    # Start from the raw JSON text, as both paths do after the scan
+    text = json.dumps(make_synthetic_scan(count))
+
+    def legacy():
+        scan_data = json.loads(text)
+        category, description, reference, code = generate.categorize_finding(scan_data)
+        return generate.store_finding(category, description, reference, code, scan_data)
+
+    def compact():
+        return generate.build_findings(json.loads(text))
+
+    def streamed():
+        return generate.collect_findings(generate.iter_semgrep_results(TextReader(text)))
+
+    print(f"Findings: {count}")
+    for name, build in (("categorize + store", legacy), ("build_findings", compact), ("streamed", streamed)):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        findings = build()
+        seconds = time.perf_counter() - start
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del findings
+        print(f"{name:<20} {seconds:6.2f}s  peak {peak / 2**20:8.1f} MiB  retained {retained / 2**20:8.1f} MiB")
+
+# File size and render time of the same report with and without --compact
+def bench_size(count):
+    high, medium, low = generate.build_findings(make_synthetic_scan(count))
+    with tempfile.TemporaryDirectory() as workdir:
+        sizes = {}
+        print(f"Findings: {count}")
+        for name, compact in (("default", False), ("compact", True)):
+            filename = os.path.join(workdir, f"{name}.pdf")
+            report_pdf.PDF.compact = compact
+            gc.collect()
+            start = time.perf_counter()
+            generate.generate_pdf_report(high, medium, low, filename, "benchmark", count)
+            seconds = time.perf_counter() - start
+            sizes[name] = os.path.getsize(filename)
+            print(f"{name:<10} {seconds:6.2f}s  {sizes[name] / 2**20:8.2f} MiB")
+        report_pdf.PDF.compact = False
+    print(f"compact is {1 - sizes['compact'] / sizes['default']:.1%} smaller")
+
+# Texts of about `size` characters for the line breaking micro-benchmarks
+def make_wrap_inputs(size, seed=1):
+    rng = random.Random(seed)
+    words = ("user input passed directly into a dangerous sink without validation may allow "
+             "attackers to execute arbitrary code sanitize the value before use").split()
+
+    def fill(make_piece, separator):
+        pieces, length = [], 0
+        while length < size:
+            piece = make_piece()
+            pieces.append(piece)
+            length += len(piece) + len(separator)
+        return separator.join(pieces)[:size]
+
+    return {
+        'prose': fill(lambda: rng.choice(words), " "),
+        # Minified code or an encoded blob: one word far wider than a line
+        'token': "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(size)),
+        'category': fill(lambda: f"rule-segment-{rng.randrange(1000)}", "."),
+        'code': fill(lambda: "    " * rng.randrange(4) + " ".join(rng.choice(words) for _ in range(rng.randrange(5, 40))),
+                     "\n"),
+    }
+
+# Time the line breaking helpers on 1KB..100KB inputs with cold width and wrap caches
+def bench_wrap(sizes, repeat=3):
+    pdf = report_pdf.PDF()
+    pdf.add_page()
+    pdf.set_font('Arial', '', 10)
+    width = pdf.get_data_width()
+    cases = (
+        ("wrap_text", 'prose', lambda text: pdf.wrap_text(text, width)),
+        ("wrap_text balanced", 'prose', lambda text: pdf.wrap_text(text, width, line_breaking="balanced")),
+        ("wrap_text long word", 'token', lambda text: pdf.wrap_text(text, width)),
+        ("truncate_text_by_height", 'prose', lambda text: pdf.truncate_text_by_height(text, width, 60)),
+        ("optimize_category_text", 'category', lambda text: pdf.optimize_category_text(text, width)),
+        ("optimize_affected_lines", 'code', lambda text: pdf.optimize_affected_lines(text, width)),
+    )
+
+    print(f"{'':<26}" + "".join(f"{size:>12}" for size in sizes))
+    inputs = {size: make_wrap_inputs(size) for size in sizes}
+    for name, kind, function in cases:
+        timings = []
+        for size in sizes:
+            best = None
+            for _ in range(repeat):
+                report_pdf.PDF._word_widths.clear()
+                pdf._wrap_cache.clear()
+                start = time.perf_counter()
+                function(inputs[size][kind])
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            timings.append(best)
+        print(f"{name:<26}" + "".join(f"{seconds * 1000:10.2f}ms" for seconds in timings))
+
+# Modules generate.py must only import when a report is actually rendered
+LAZY_MODULES = ("report_pdf", "fpdf", "rich")
+
+# Parse `python -X importtime` output into (depth, cumulative microseconds, module) tuples
+def parse_importtime(stderr):
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # Column headers
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, int(cumulative), name.strip()))
+    return entries
+
+# Import time of generate.py, its heaviest direct imports and the wall time of `generate.py --help`
+def bench_startup(runs, max_import_ms=None):
+    """Return the list of regressions (lazy modules imported eagerly, import time over the limit)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, "-X", "importtime", "-c", "import generate"]
+    # One untimed run so the bytecode cache is warm
+    subprocess.run(command, cwd=here, capture_output=True, check=True)
+
+    import_ms = []
+    for _ in range(runs):
+        result = subprocess.run(command, cwd=here, capture_output=True, text=True, check=True)
+        entries = parse_importtime(result.stderr)
+        generate_index = next(i for i, entry in enumerate(entries) if entry[0] == 0 and entry[2] == "generate")
+        import_ms.append(entries[generate_index][1] / 1000)
+
+    # Direct imports of generate are the depth 1 entries printed since the previous top-level import
+    direct = []
+    for depth, us, name in reversed(entries[:generate_index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            direct.append((us, name))
+
+    help_seconds = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(here, "generate.py"), "--help"], capture_output=True, check=True)
+        help_seconds.append(time.perf_counter() - start_time)
+
+    print(f"import generate:     {statistics.median(import_ms):8.1f} ms (median of {runs})")
+    print(f"generate.py --help:  {statistics.median(help_seconds) * 1000:8.1f} ms wall (median of {runs})")
+    print("Heaviest direct imports:")
+    for us, name in sorted(direct, reverse=True)[:8]:
+        print(f"  {name:<24} {us / 1000:8.1f} ms")
+
+    regressions = [f"{name} is imported at startup" for _, _, name in entries if name in LAZY_MODULES]
+    if max_import_ms is not None and statistics.median(import_ms) > max_import_ms:
+        regressions.append(f"import generate took {statistics.median(import_ms):.1f} ms (limit {max_import_ms} ms)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the report pipeline")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    # Options of the synthetic semgrep output shared by the pipeline and synthetic commands
+    generator = argparse.ArgumentParser(add_help=False)
+    generator.add_argument("--rules", type=int, default=37, help="Number of distinct rules")
+    generator.add_argument("--message-words", type=int_list, default=(10, 40, 120),
+                           help="Words per rule message, picked at random from the list")
+    generator.add_argument("--code-lines", type=int_list, default=(1, 2, 6),
+                           help="Lines of extra.lines per result, picked at random from the list")
+    generator.add_argument("--reference-segments", type=int_list, default=(1, 3, 12),
+                           help="Path segments per reference URL, picked at random from the list")
+
+    pipeline = subparsers.add_parser("pipeline", parents=[generator],
+                                     help="Time and peak memory of every pipeline stage at several sizes")
+    pipeline.add_argument("--sizes", type=int_list, default=(100, 1000, 10000, 100000), help="Finding counts")
+    pipeline.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    pipeline.add_argument("--json", metavar="FILE", help="Save the results for later comparison")
+    pipeline.add_argument("--compare", metavar="FILE", help="Fail if a stage is slower than in this saved run")
+    pipeline.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown for --compare (0.25 = 25%%)")
+
+    synthetic = subparsers.add_parser("synthetic", parents=[generator], help="Write synthetic semgrep JSON")
+    synthetic.add_argument("--count", type=int, default=1000, help="Number of synthetic findings")
+    synthetic.add_argument("--output", required=True, help="JSON file to write")
+
+    layout = subparsers.add_parser("layout", help="Per-finding layout and render time")
+    layout.add_argument("--count", type=int, default=10000, help="Number of synthetic findings")
+
+    memory = subparsers.add_parser("memory", help="Memory of the findings representation")
+    memory.add_argument("--count", type=int, default=100000, help="Number of synthetic findings")
+
+    startup = subparsers.add_parser("startup", help="Import time of generate.py and --help latency")
+    startup.add_argument("--runs", type=int, default=5, help="Runs per measurement (the median is reported)")
+    startup.add_argument("--max-import-ms", type=float, help="Fail if importing generate takes longer")
+
+    wrap = subparsers.add_parser("wrap", help="Line breaking time on 1KB, 10KB and 100KB inputs")
+    wrap.add_argument("--sizes", type=int_list, default=(1024, 10240, 102400), help="Input sizes in characters")
+    wrap.add_argument("--repeat", type=int, default=3, help="Runs per input (the fastest is reported)")
+
+    size = subparsers.add_parser("size", help="PDF size and render time with and without --compact")
+    size.add_argument("--count", type=int, default=5000, help="Number of synthetic findings")
+
+    args = parser.parse_args()
+    if args.benchmark in ("pipeline", "synthetic"):
+        generator_options = {
+            'rules': args.rules,
+            'message_words': args.message_words,
+            'code_lines': args.code_lines,
+            'reference_segments': args.reference_segments,
+        }
+
+    if args.benchmark == "pipeline":
+        report = bench_pipeline(args.sizes, generator_options, memory=not args.no_memory)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare_pipeline(report, json.load(f), args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION: {regression}")
+            if regressions:
+                sys.exit(1)
+    elif args.benchmark == "synthetic":
+        with open(args.output, 'w') as f:
+            json.dump(make_synthetic_scan(args.count, **generator_options), f)
+    elif args.benchmark == "layout":
+        bench_layout(args.count)
+    elif args.benchmark == "memory":
+        bench_memory(args.count)
+    elif args.benchmark == "size":
+        bench_size(args.count)
+    elif args.benchmark == "wrap":
+        bench_wrap(args.sizes, args.repeat)
+    elif args.benchmark == "startup":
+        regressions = bench_startup(args.runs, args.max_import_ms)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,778 +1,1564 @@
+import argparse
+import hashlib
+import json
+import os
 import subprocess
 import sys
 import re
-from rich.progress import SpinnerColumn, Progress, TextColumn
-from fpdf import FPDF
+import threading
+from contextlib import contextmanager, nullcontext
+
+from line_breaking import LINE_BREAKERS
 
 class Findings:
+    __slots__ = ('category', 'description', 'reference', 'code')
+
     def __init__(self, category, description, reference, code):
         self.category = category
         self.description = description
         self.reference = reference
         self.code = code
 
-class PDF(FPDF):
-    def __init__(self):
-        super().__init__()
-        # Set proper page margins
-        self.set_margins(20, 20, 20)  # Left, Top, Right margins
-        self.set_auto_page_break(auto=True, margin=25)  # Bottom margin
-    
-    def header(self):
-        # Set background color for header
-        self.set_fill_color(240, 240, 240)
-        self.rect(0, 0, self.w, 25, 'F')
-        
-        # Company/Project title
-        self.set_font('Arial', 'B', size=12)
-        self.set_text_color(50, 50, 50)
-        self.cell(0, 10, 'Static Application Security Testing Report', 0, 0, 'C')
-        
-        # Subtitle
-        self.set_font('Arial', '', size=8)
-        self.set_text_color(100, 100, 100)
-        self.cell(0, 10, 'Generated by Semgrep CLI', 0, 0, 'C')
-        
-        # Line break
-        self.ln(20)
-
-    def footer(self):
-        # Position at 1.5 cm from bottom
-        self.set_y(-15)
-        # Set footer background
-        self.set_fill_color(240, 240, 240)
-        self.rect(0, self.h-15, self.w, 15, 'F')
-        
-        # Page number and generation info
-        self.set_font('Arial', '', size=8)
-        self.set_text_color(100, 100, 100)
-        
-        # Left side - Generation timestamp
-        self.cell(0, 10, f'Generated: {self.get_generation_time()}', 0, 0, 'L')
-        
-        # Right side - Page number
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'R')
-
-    def get_generation_time(self):
-        """Get current timestamp for footer"""
-        from datetime import datetime
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # Clean latin-1
-    def clean_text(self, text):
-        return text.encode("latin-1", "ignore").decode("latin-1")
-
-    # Handle long text by truncating if necessary
-    def truncate_text(self, text, max_length=150):
-        if len(text) <= max_length:
-            return text
-        return text[:max_length-3] + "..."
-
-    # Handle long text by truncating based on available height
-    def truncate_text_by_height(self, text, max_width, max_height, line_height=6):  # Changed default from 10 to 6
-        # Calculate how many lines we can fit
-        max_lines = int(max_height / line_height)
-        # Use consistent character width calculation
-        chars_per_line = int(max_width / 1.7)  # Updated from 1.6 to 1.7
-        
-        # If text fits in one line, return as is
-        if len(text) <= chars_per_line:
-            return text
-        
-        # For text with hyphens, be extra careful about line breaks
-        if '-' in text:
-            # Try to keep hyphenated terms together
-            words = text.split()
-            lines = []
-            current_line = ""
-            
-            for word in words:
-                # Check if adding this word would exceed the line width
-                test_line = current_line + " " + word if current_line else word
-                
-                if len(test_line) <= chars_per_line:
-                    # Word fits on current line
-                    current_line = test_line
-                else:
-                    # Word doesn't fit, but check if it contains hyphens
-                    if '-' in word and len(word) > chars_per_line:
-                        # This word has hyphens and is too long - keep it together
-                        if current_line:
-                            lines.append(current_line)
-                        lines.append(word)
-                        current_line = ""
-                    else:
-                        # Normal word, start new line
-                        if current_line:
-                            lines.append(current_line)
-                        current_line = word
-            
-            # Add the last line if there's content
-            if current_line:
-                lines.append(current_line)
-            
-            # Limit to max_lines and join
-            if len(lines) <= max_lines:
-                return '\n'.join(lines)
-            else:
-                # If we have more lines than can fit, truncate at word boundaries
-                truncated_lines = lines[:max_lines]
-                return '\n'.join(truncated_lines)
-        
-        # Original logic for text without hyphens
-        # Split text into words and build lines intelligently
-        words = text.split()
-        lines = []
-        current_line = ""
-        
-        for word in words:
-            # Check if adding this word would exceed the line width
-            test_line = current_line + " " + word if current_line else word
-            
-            if len(test_line) <= chars_per_line:
-                # Word fits on current line
-                current_line = test_line
-            else:
-                # Word doesn't fit, start new line
-                if current_line:
-                    lines.append(current_line)
-                    current_line = word
-                else:
-                    # Single word is too long, split it intelligently
-                    if len(word) > chars_per_line:
-                        # Try to break at hyphens or underscores first
-                        if '-' in word:
-                            parts = word.split('-')
-                            for i, part in enumerate(parts):
-                                if i > 0:
-                                    part = '-' + part
-                                if len(part) <= chars_per_line:
-                                    lines.append(part)
-                                else:
-                                    # Break long part into chunks
-                                    for j in range(0, len(part), chars_per_line):
-                                        chunk = part[j:j + chars_per_line]
-                                        lines.append(chunk)
-                        elif '_' in word:
-                            parts = word.split('_')
-                            for i, part in enumerate(parts):
-                                if i > 0:
-                                    part = '_' + part
-                                if len(word) <= chars_per_line:
-                                    lines.append(word)
-                                else:
-                                    # Break long word into chunks
-                                    for i in range(0, len(word), chars_per_line):
-                                        chunk = word[i:i + chars_per_line]
-                                        lines.append(chunk)
-                        else:
-                            # Break long word into chunks
-                            for i in range(0, len(word), chars_per_line):
-                                chunk = word[i:i + chars_per_line]
-                                lines.append(chunk)
-                    else:
-                        lines.append(word)
-                    current_line = ""
-        
-        # Add the last line if there's content
-        if current_line:
-            lines.append(current_line)
-        
-        # Limit to max_lines and join
-        if len(lines) <= max_lines:
-            return '\n'.join(lines)
+class CompactFinding:
+    """Finding built directly from a semgrep JSON result.
+
+    Slotted, with the strings that repeat across large scans (rule ids, paths,
+    messages, references) interned so every occurrence shares one object. The
+    description is composed from path and detail when it is read instead of
+    being stored per finding. The fingerprint is the one baseline mode
+    matches results by (see finding_fingerprint).
+    """
+    __slots__ = ('category', 'path', 'detail', 'reference', 'code', 'confidence', 'line', 'fingerprint')
+
+    def __init__(self, category, path, detail, reference, code, confidence="", line="?", fingerprint=None):
+        self.category = category
+        self.path = path
+        self.detail = detail
+        self.reference = reference
+        self.code = code
+        self.confidence = confidence
+        self.line = line
+        self.fingerprint = fingerprint
+
+    @property
+    def description(self):
+        return " - ".join([self.path, self.detail]).strip()
+
+class FindingGroup:
+    """All occurrences of one rule (optionally within one file) rendered as a single table"""
+    __slots__ = ('category', 'description', 'reference', 'occurrences', 'confidence')
+
+    # Occurrences listed in the table before the rest are summarized
+    MAX_LISTED = 40
+    code_label = "Occurrences"
+
+    def __init__(self, category, description, reference, confidence=""):
+        self.category = category
+        self.description = description
+        self.reference = reference
+        self.occurrences = []  # (path, line) tuples
+        self.confidence = confidence
+
+    @property
+    def count(self):
+        return len(self.occurrences)
+
+    @property
+    def code(self):
+        listed = ", ".join(f"{path}:{line}" for path, line in self.occurrences[:self.MAX_LISTED])
+        if self.count > self.MAX_LISTED:
+            listed += f" ... and {self.count - self.MAX_LISTED} more"
+        return f"{self.count} occurrence{'s' if self.count != 1 else ''}: {listed}"
+
+# Number of findings in a severity list, counting every occurrence of grouped findings
+def count_findings(findings):
+    return sum(getattr(finding, 'count', 1) for finding in findings)
+
+# Section header colors (background, text) and spacing after each severity section
+SEVERITY_SECTIONS = (
+    ("High", (255, 200, 200), (150, 0, 0), 3),
+    ("Medium", (255, 240, 200), (150, 100, 0), 3),
+    ("Low", (200, 255, 200), (0, 100, 0), 0),
+)
+
+# Peak RSS of this process, CPU time of finished child processes and the largest child's peak RSS
+def resource_usage():
+    """Return (peak_rss_mib, children_cpu_seconds, children_peak_rss_mib), or Nones where unsupported"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None, None, None
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (round(own.ru_maxrss * scale / 2**20, 2),
+            round(children.ru_utime + children.ru_stime, 3),
+            round(children.ru_maxrss * scale / 2**20, 2))
+
+class Profiler:
+    """Wall time, CPU time and peak RSS of each pipeline stage.
+
+    Stages nest (`report` contains `report.section.high`, ...). Every finished
+    stage is a dict that is passed to the registered hooks and kept for the
+    JSON trace. Peak RSS is the process high-water mark at the end of the
+    stage, so `peak_rss_growth_mib` shows which stage raised it. Semgrep runs
+    as a child process and shows up in the `children_*` fields.
+    """
+
+    def __init__(self, hooks=()):
+        import time
+
+        self.hooks = list(hooks)
+        self.stages = []
+        self.started = time.time()
+        self._open = []
+
+    @contextmanager
+    def stage(self, name, **details):
+        import time
+
+        record = {'name': name, 'parent': self._open[-1]['name'] if self._open else None, **details}
+        self.stages.append(record)
+        self._open.append(record)
+        rss_before, children_cpu_before, _ = resource_usage()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - wall_start, 6)
+            record['cpu_seconds'] = round(time.process_time() - cpu_start, 6)
+            peak_rss, children_cpu, children_peak_rss = resource_usage()
+            if peak_rss is not None:
+                record['peak_rss_mib'] = peak_rss
+                record['peak_rss_growth_mib'] = round(peak_rss - rss_before, 2)
+                record['children_cpu_seconds'] = round(children_cpu - children_cpu_before, 3)
+                record['children_peak_rss_mib'] = children_peak_rss
+            self._open.pop()
+            for hook in self.hooks:
+                hook(record)
+
+    def trace(self, **metadata):
+        """The JSON trace: run metadata plus every stage in start order"""
+        import platform
+
+        return {
+            'started_at': self.started,
+            'python': platform.python_version(),
+            'platform': sys.platform,
+            **metadata,
+            'stages': self.stages,
+        }
+
+# Functions called with every finished stage record while profiling
+profile_hooks = []
+
+# Active profiler; stages are not recorded while it is None
+profiler = None
+
+# Register a function called with the record (a dict) of every finished stage
+def add_profile_hook(hook):
+    profile_hooks.append(hook)
+
+def start_profiling():
+    global profiler
+    profiler = Profiler(profile_hooks)
+    return profiler
+
+def stop_profiling(**metadata):
+    """Stop recording and return the JSON trace of the recorded stages"""
+    global profiler
+    finished, profiler = profiler, None
+    return finished.trace(**metadata) if finished else None
+
+# Context manager around one pipeline stage; yields the stage record for extra details
+def profile_stage(name, **details):
+    if profiler is None:
+        return nullcontext({})
+    return profiler.stage(name, **details)
+
+# Print the stages of a trace as an indented table
+def print_profile(trace):
+    depth = {None: -1}
+    print(f"{'Stage':<32} {'Wall (s)':>9} {'CPU (s)':>9} {'Child CPU':>10} {'Peak RSS':>9}")
+    for stage in trace['stages']:
+        depth[stage['name']] = depth.get(stage['parent'], -1) + 1
+        name = "  " * depth[stage['name']] + stage['name']
+        child_cpu = stage.get('children_cpu_seconds')
+        peak_rss = stage.get('peak_rss_mib')
+        print(f"{name[:32]:<32} {stage['wall_seconds']:>9.3f} {stage['cpu_seconds']:>9.3f} "
+              f"{'-' if child_cpu is None else f'{child_cpu:.3f}':>10} "
+              f"{'-' if peak_rss is None else f'{peak_rss:.0f} MiB':>9}")
+
+# Progress display for a semgrep run: indeterminate until semgrep reports a percentage
+def scan_progress():
+    from rich.progress import SpinnerColumn, Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn
+
+    progress = Progress(
+        SpinnerColumn(),
+        TextColumn("[bold blue]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        TimeRemainingColumn(),
+    )
+    progress.start()
+    return progress
+
+class SemgrepProgress:
+    """Reads semgrep's stderr on a background thread and follows its progress.
+
+    Semgrep redraws its progress line with carriage returns, so stderr is read
+    in raw chunks instead of by line. "Scanning N files" updates the
+    description and percentages turn the bar determinate. The complete stderr
+    text is kept for error messages.
+    """
+    FILES = re.compile(r"Scanning (\d+) files")
+    PERCENT = re.compile(r"(\d{1,3}(?:\.\d+)?)\s*%")
+
+    def __init__(self, stream, progress=None):
+        import codecs
+
+        self.stream = stream
+        self.progress = progress
+        self.task = progress.add_task("Scanning...", total=None) if progress is not None else None
+        self.chunks = []
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def join(self):
+        self.thread.join()
+
+    @property
+    def text(self):
+        return b"".join(self.chunks).decode("utf-8", errors="replace")
+
+    def finish(self, description):
+        if self.progress is not None:
+            self.progress.update(self.task, total=100, completed=100, description=description)
+
+    def _read(self):
+        while True:
+            chunk = self.stream.read1(65536)
+            if not chunk:
+                break
+            self.feed(chunk)
+        self.close()
+
+    def feed(self, chunk):
+        """Add a chunk of stderr output (bytes)"""
+        self.chunks.append(chunk)
+        if self.progress is None:
+            return
+        *lines, self._pending = re.split(r"[\r\n]", self._pending + self._decoder.decode(chunk))
+        for line in lines:
+            self.update(line)
+
+    def close(self):
+        if self._pending and self.progress is not None:
+            self.update(self._pending)
+        self._pending = ""
+
+    def update(self, line):
+        files = self.FILES.search(line)
+        if files:
+            self.progress.update(self.task, description=f"Scanning {files.group(1)} files")
+        percent = self.PERCENT.search(line)
+        if percent:
+            self.progress.update(self.task, total=100, completed=min(float(percent.group(1)), 100))
+
+# Determinate progress bar over the findings drawn into the PDF, with throughput and ETA.
+# Yields the callback that PDF.write_to_table() advances every PDF.PROGRESS_STEP findings.
+@contextmanager
+def render_progress(total):
+    import time
+    from rich.progress import Progress, TextColumn, BarColumn, MofNCompleteColumn, TimeRemainingColumn
+
+    progress = Progress(
+        TextColumn("[bold blue]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TextColumn("{task.fields[rate]}"),
+        TimeRemainingColumn(),
+    )
+    task = progress.add_task("Rendering findings", total=total, rate="")
+    start = time.perf_counter()
+    done = 0
+
+    def advance(count, description=None):
+        nonlocal done
+        done += count
+        elapsed = time.perf_counter() - start
+        rate = f"{done / elapsed:,.0f} findings/s" if elapsed > 0 else ""
+        progress.update(task, completed=done, rate=rate, description=description or "Rendering findings")
+
+    with progress:
+        yield advance
+
+class ScanConfig:
+    """Semgrep options shared by every scan of a run.
+
+    Loaded from a JSON file (--scan-config) with command line flags taking
+    precedence, and turned into semgrep arguments so semgrep is executed
+    directly, without a shell.
+    """
+    # (attribute, semgrep flag); list attributes repeat the flag per value
+    OPTIONS = (
+        ('config', '--config'),
+        ('jobs', '--jobs'),
+        ('max_memory', '--max-memory'),
+        ('timeout', '--timeout'),
+        ('max_target_bytes', '--max-target-bytes'),
+        ('exclude', '--exclude'),
+    )
+    LISTS = ('config', 'exclude')
+
+    def __init__(self, config=None, jobs=None, max_memory=None, timeout=None, max_target_bytes=None, exclude=None):
+        # Semgrep runs from the project directory, so local rule files and directories need absolute paths;
+        # other values are registry names (p/python) or URLs and are passed as given
+        self.config = [os.path.abspath(value) if os.path.exists(value) else value for value in config or []]
+        self.jobs = jobs
+        self.max_memory = max_memory
+        self.timeout = timeout
+        self.max_target_bytes = max_target_bytes
+        self.exclude = list(exclude or [])
+
+    @classmethod
+    def load(cls, filename=None, **overrides):
+        """Options from `filename` (keys as in OPTIONS, dashes allowed), overridden by the given values"""
+        values = {}
+        if filename:
+            with open(filename) as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError(f"{filename} must contain a JSON object")
+            values = {key.replace('-', '_'): value for key, value in data.items()}
+            unknown = set(values) - {name for name, _ in cls.OPTIONS}
+            if unknown:
+                raise ValueError(f"Unknown option(s) in {filename}: {', '.join(sorted(unknown))}")
+            for name in cls.LISTS:
+                if isinstance(values.get(name), str):
+                    values[name] = [values[name]]
+        values.update({name: value for name, value in overrides.items() if value is not None})
+        return cls(**values)
+
+    def arguments(self, jobs=None):
+        """semgrep arguments; `jobs` overrides the configured --jobs (e.g. per shard)"""
+        arguments = []
+        for name, flag in self.OPTIONS:
+            value = jobs if name == 'jobs' and jobs else getattr(self, name)
+            if name in self.LISTS:
+                for item in value:
+                    arguments += [flag, str(item)]
+            elif value is not None:
+                arguments += [flag, str(value)]
+        return arguments
+
+    def command(self, targets=(".",), jobs=None):
+        return ["semgrep", "scan", "--json", *self.arguments(jobs), *targets]
+
+    def cache_key(self):
+        """The options that change which results semgrep reports (part of the result cache key)"""
+        key = {name: getattr(self, name) for name in ('config', 'timeout', 'max_target_bytes', 'exclude', 'max_memory')}
+        return json.dumps(key, sort_keys=True) if any(key.values()) else ""
+
+    def describe(self):
+        return " ".join(self.arguments())
+
+# Start semgrep on `targets` from the project directory, with JSON on stdout and stderr followed in the background.
+# The directory is passed as the subprocess cwd so the process-global cwd is never changed and
+# several scans can run side by side.
+def start_semgrep(path, config=None, targets=(".",), jobs=None, progress=None):
+    """Return the process and the started SemgrepProgress reading its stderr; see finish_semgrep()"""
+    command = (config or ScanConfig()).command(targets, jobs)
+    try:
+        process = subprocess.Popen(command, cwd=path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        if isinstance(e, FileNotFoundError) and e.filename == command[0]:
+            raise RuntimeError("semgrep not found on PATH")
+        raise RuntimeError(f"could not start semgrep: {e}")
+    # Drain stderr in the background so a chatty semgrep can't block on a full pipe
+    return process, SemgrepProgress(process.stderr, progress).start()
+
+# Wait for a semgrep process from start_semgrep() and warn if it failed
+def finish_semgrep(process, stderr_reader, description="Done"):
+    process.stdout.close()
+    returncode = process.wait()
+    stderr_reader.join()
+    stderr_reader.finish(description)
+    # Whatever semgrep wrote is still used, in case there are partial results
+    if returncode != 0:
+        print(f"Warning: Semgrep command failed with return code {returncode}")
+        if stderr_reader.text:
+            print(f"Error output: {stderr_reader.text}")
+    return returncode
+
+# Scan the code for vulnerability using semgrep cli
+def scan(path, show_progress=True, config=None):
+    with profile_stage("scan.semgrep"):
+        progress = scan_progress() if show_progress else None
+        try:
+            process, stderr_reader = start_semgrep(path, config, progress=progress)
+            stdout = process.stdout.read().decode("utf-8", errors="replace")
+            finish_semgrep(process, stderr_reader)
+        finally:
+            if progress is not None:
+                progress.stop()
+
+    # Parse JSON output
+    try:
+        with profile_stage("scan.parse", stdout_chars=len(stdout)):
+            json_data = json.loads(stdout)
+        # Validate that we have the expected structure
+        if 'results' in json_data and isinstance(json_data['results'], list):
+            return json_data
         else:
-            # If we have more lines than can fit, truncate at word boundaries
-            truncated_lines = lines[:max_lines]
-            return '\n'.join(truncated_lines)
-
-    # Specialized method for second column to maximize space utilization
-    def optimize_second_column_layout(self, text, max_width, line_height=6):
-        """Optimize layout specifically for the second column to minimize wasted space"""
-        # Use even more aggressive character width calculation for data column
-        chars_per_line = int(max_width / 1.7)  # Updated from 1.6 to 1.7
-        
-        if len(text) <= chars_per_line:
-            return text
-        
-        # Split text into words and build highly optimized lines
-        words = text.split()
-        lines = []
-        current_line = ""
-        
-        for i, word in enumerate(words):
-            # Check if adding this word would exceed the line width
-            test_line = current_line + " " + word if current_line else word
-            
-            if len(test_line) <= chars_per_line:
-                # Word fits on current line
-                current_line = test_line
-            else:
-                # Word doesn't fit, optimize current line before breaking
-                if current_line:
-                    # Calculate wasted space
-                    wasted_space = chars_per_line - len(current_line)
-                    
-                    # If wasted space is more than 15% (more aggressive than 20%), try to fit more
-                    if wasted_space > chars_per_line * 0.15:
-                        # Look ahead more aggressively to find better line combinations
-                        remaining_words = words[i:]
-                        best_line = current_line
-                        best_utilization = len(current_line) / chars_per_line
-                        
-                        # Try different combinations of remaining words
-                        temp_line = current_line
-                        for j, next_word in enumerate(remaining_words):
-                            test_temp = temp_line + " " + next_word
-                            if len(test_temp) <= chars_per_line:
-                                temp_line = test_temp
-                                utilization = len(temp_line) / chars_per_line
-                                
-                                # Keep the line with best space utilization
-                                if utilization > best_utilization:
-                                    best_line = temp_line
-                                    best_utilization = utilization
-                            else:
-                                break
-                        
-                        # Use the best line we found
-                        if best_utilization > len(current_line) / chars_per_line:
-                            current_line = best_line
-                            # Skip the words we just added
-                            i += len(best_line.split()) - len(current_line.split()) - 1
-                    
-                    # Add the optimized line
-                    lines.append(current_line)
-                    current_line = word
-                else:
-                    # Start new line
-                    current_line = word
-        
-        # Add the last line if there's content
-        if current_line:
-            lines.append(current_line)
-        
-        return '\n'.join(lines)
-
-    # Create a smart summary for extremely long descriptions
-    def create_smart_summary(self, text, max_lines=12, chars_per_line=60):  # Increased max_lines from 8 to 12
-        """Create a smart summary for very long descriptions"""
-        if len(text) <= chars_per_line * 2:
-            return text  # Short enough, return as is
-        
-        # Split into sentences for better summary
-        sentences = text.split('. ')
-        if len(sentences) <= 2:
-            # If only 1-2 sentences, just truncate at word boundary
-            words = text.split()
-            summary = ""
-            for word in words:
-                if len(summary + " " + word) <= chars_per_line * max_lines:
-                    summary += " " + word if summary else word
-                else:
+            print("Warning: Semgrep JSON output doesn't have expected 'results' structure, falling back to text parsing")
+            return stdout
+    except json.JSONDecodeError:
+        print("Warning: Could not parse semgrep JSON output, falling back to text parsing")
+        return stdout
+
+class SemgrepResultParser:
+    """Incremental parser for semgrep JSON output.
+
+    Text is fed in arbitrary chunks and every entry of the top-level
+    'results' array is returned as soon as it is complete, so only one
+    result has to be held in memory at a time. All other top-level keys
+    (version, errors, paths, ...) are kept in `metadata`.
+    """
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.metadata = {}
+        self.result_count = 0
+        self._chunks = []
+        self._pending = 0
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        # Wait for this much unparsed text before retrying an incomplete value
+        self._wait_for = 0
+
+    def feed(self, text):
+        """Add a chunk of text and return the results completed by it"""
+        self._chunks.append(text)
+        self._pending += len(text)
+        if (len(self._buffer) - self._pos) + self._pending < self._wait_for:
+            return []
+        return self._parse(eof=False)
+
+    def close(self):
+        """Parse what is left and check that the document was complete"""
+        results = self._parse(eof=True)
+        if self._state != "done":
+            raise ValueError("Semgrep JSON output ended unexpectedly")
+        return results
+
+    def _parse(self, eof):
+        # Drop the consumed prefix so the buffer only holds unparsed text
+        self._buffer = self._buffer[self._pos:] + "".join(self._chunks)
+        self._chunks = []
+        self._pending = 0
+        self._pos = 0
+        self._wait_for = 0
+
+        results = []
+        buffer = self._buffer
+        while True:
+            pos = self._pos
+            # Skip whitespace and separators
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            self._pos = pos
+            if pos >= len(buffer) or self._state == "done":
+                break
+
+            char = buffer[pos]
+            if self._state == "start":
+                if char != "{":
+                    raise ValueError("Semgrep JSON output is not an object")
+                self._state = "key"
+                self._pos = pos + 1
+            elif self._state == "key":
+                if char == "}":
+                    self._state = "done"
+                    self._pos = pos + 1
+                    continue
+                value = self._decode(pos, eof)
+                if value is None:
                     break
-            return summary + "..." if len(summary) < len(text) else summary
-        
-        # Take first few sentences that fit within the limit
-        summary = ""
-        for sentence in sentences:
-            if len(summary + sentence + ". ") <= chars_per_line * max_lines:
-                summary += sentence + ". " if summary else sentence + ". "
-            else:
+                self._key = value
+                self._state = "colon"
+            elif self._state == "colon":
+                if char != ":":
+                    raise ValueError("Malformed semgrep JSON output")
+                self._pos = pos + 1
+                self._state = "results_open" if self._key == "results" else "value"
+            elif self._state == "value":
+                value = self._decode(pos, eof)
+                if value is None:
+                    break
+                self.metadata[self._key] = value
+                self._state = "key"
+            elif self._state == "results_open":
+                if char != "[":
+                    raise ValueError("Semgrep JSON 'results' is not a list")
+                self._pos = pos + 1
+                self._state = "results"
+            elif self._state == "results":
+                if char == "]":
+                    self._pos = pos + 1
+                    self._state = "key"
+                    continue
+                value = self._decode(pos, eof)
+                if value is None:
+                    break
+                self.result_count += 1
+                results.append(value)
+
+        return results
+
+    def _decode(self, pos, eof):
+        # Returns None (and waits for more input) when the value is incomplete
+        try:
+            value, end = self.decoder.raw_decode(self._buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError("Semgrep JSON output ended unexpectedly")
+            # Retry only once the unparsed text has doubled to keep parsing linear
+            self._wait_for = 2 * (len(self._buffer) - pos)
+            return None
+        if end >= len(self._buffer) and not eof:
+            # A number at the end of the buffer might still continue
+            self._wait_for = len(self._buffer) - pos + 1
+            return None
+        self._pos = end
+        return value
+
+# Read semgrep JSON from a file-like object and yield results one at a time
+def iter_semgrep_results(stream, parser=None, chunk_size=65536):
+    import codecs
+
+    if parser is None:
+        parser = SemgrepResultParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        yield from parser.feed(chunk)
+
+    yield from parser.feed(decoder.decode(b"", final=True))
+    yield from parser.close()
+
+# Scan the code with semgrep and stream the JSON results as they are produced
+def scan_stream(path, show_progress=True, config=None):
+    parser = SemgrepResultParser()
+    progress = scan_progress() if show_progress else None
+    try:
+        process, stderr_reader = start_semgrep(path, config, progress=progress)
+        try:
+            for result in iter_semgrep_results(process.stdout, parser):
+                yield result
+        except ValueError as e:
+            print(f"Warning: Could not parse semgrep JSON output: {e}")
+        finally:
+            finish_semgrep(process, stderr_reader, f"Done ({parser.result_count} results)")
+    finally:
+        if progress is not None:
+            progress.stop()
+
+# List the files semgrep would consider in a project, relative to the project root
+def list_project_files(path):
+    # Prefer git so ignored and untracked-but-ignored files are skipped like semgrep does
+    result = subprocess.run(
+        ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+        cwd=path, capture_output=True,
+    )
+    if result.returncode == 0:
+        files = [name for name in result.stdout.decode("utf-8", "replace").split("\0") if name]
+        return sorted(name for name in files if os.path.isfile(os.path.join(path, name)))
+
+    files = []
+    for root, dirs, names in os.walk(path):
+        # Skip hidden directories (.git, .cache, ...) and generated reports
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d != 'reports']
+        for name in names:
+            files.append(os.path.relpath(os.path.join(root, name), path))
+    return sorted(files)
+
+# semgrep --version, asked once per process: starting semgrep takes about a second
+semgrep_version_cache = None
+
+def semgrep_version():
+    global semgrep_version_cache
+    if semgrep_version_cache is None:
+        try:
+            semgrep_version_cache = subprocess.run(["semgrep", "--version"], capture_output=True, text=True).stdout.strip()
+        except OSError:
+            semgrep_version_cache = "unknown"
+    return semgrep_version_cache
+
+# Add the contents of a rule file, or of every file under a rule directory, to `digest`
+def hash_rule_files(digest, rules_path):
+    if os.path.isfile(rules_path):
+        rule_files = [rules_path]
+    elif os.path.isdir(rules_path):
+        rule_files = sorted(os.path.join(root, name) for root, _, names in os.walk(rules_path) for name in names)
+    else:
+        return
+    for rule_file in rule_files:
+        with open(rule_file, 'rb') as f:
+            digest.update(f.read())
+
+# Identify the rules in use so cached results are dropped when they change
+def get_ruleset_version(path, config=None):
+    digest = hashlib.sha256()
+    version = semgrep_version()
+    digest.update(version.encode())
+    if config is not None:
+        digest.update(config.cache_key().encode())
+        # Local --config rules can change while their path stays the same
+        for rules_path in config.config:
+            hash_rule_files(digest, rules_path)
+
+    # Local rule files in the project are part of the ruleset as well
+    for rules in ('.semgrep.yml', '.semgrep.yaml', '.semgrep'):
+        hash_rule_files(digest, os.path.join(path, rules))
+
+    return f"{version}:{digest.hexdigest()[:16]}"
+
+class ScanCache:
+    """On-disk cache of semgrep results per file.
+
+    Entries are keyed by ruleset version and file content hash and stored in
+    SQLite under reports/<project>/.cache, so only files that changed since the
+    last run have to be scanned again.
+    """
+
+    def __init__(self, project_name, ruleset):
+        import sqlite3
+
+        cache_dir = os.path.join("reports", project_name, ".cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.ruleset = ruleset
+        self.db = sqlite3.connect(os.path.join(cache_dir, "scan-cache.sqlite"))
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT, ruleset TEXT, results TEXT)"
+        )
+
+    def file_hash(self, root, name):
+        """Content hash of a file, reusing the stored hash if size and mtime are unchanged"""
+        stat = os.stat(os.path.join(root, name))
+        row = self.db.execute("SELECT size, mtime_ns, hash FROM files WHERE path = ?", (name,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2], stat
+
+        digest = hashlib.sha256()
+        with open(os.path.join(root, name), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest(), stat
+
+    def lookup(self, name, content_hash):
+        """Cached results for a file, or None when it has to be rescanned"""
+        row = self.db.execute(
+            "SELECT results FROM files WHERE path = ? AND hash = ? AND ruleset = ?",
+            (name, content_hash, self.ruleset),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store(self, name, content_hash, stat, results):
+        self.db.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, ruleset, results) VALUES (?, ?, ?, ?, ?, ?)",
+            (name, stat.st_size, stat.st_mtime_ns, content_hash, self.ruleset, json.dumps(results)),
+        )
+
+    def all_results(self):
+        """Every cached result for the current ruleset, i.e. the results of the last cached run"""
+        results = []
+        for (stored,) in self.db.execute("SELECT results FROM files WHERE ruleset = ? ORDER BY path", (self.ruleset,)):
+            results.extend(json.loads(stored))
+        return results
+
+    def prune(self, names):
+        """Forget files that no longer exist in the project"""
+        present = set(names)
+        stale = [(name,) for (name,) in self.db.execute("SELECT path FROM files") if name not in present]
+        self.db.executemany("DELETE FROM files WHERE path = ?", stale)
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+class FindingsDB:
+    """SQLite store of every recorded run and its findings, shared by all projects.
+
+    Each run keeps its individual findings, indexed by project, rule,
+    severity, path and fingerprint (runs by project and time), so reports
+    can be regenerated and questions like "where does rule X fire" are
+    answered without rescanning.
+    """
+    DEFAULT_PATH = os.path.join("reports", "findings.sqlite")
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY, project TEXT NOT NULL, started_at REAL NOT NULL,
+            report TEXT, mode TEXT, findings INTEGER);
+        CREATE INDEX IF NOT EXISTS runs_project ON runs (project, started_at);
+        CREATE TABLE IF NOT EXISTS findings (
+            run_id INTEGER NOT NULL REFERENCES runs (id), project TEXT NOT NULL, severity TEXT NOT NULL,
+            rule TEXT, path TEXT, line INTEGER, fingerprint TEXT, confidence TEXT,
+            detail TEXT, reference TEXT, code TEXT);
+        CREATE INDEX IF NOT EXISTS findings_run ON findings (run_id, severity);
+        CREATE INDEX IF NOT EXISTS findings_project ON findings (project);
+        CREATE INDEX IF NOT EXISTS findings_rule ON findings (rule);
+        CREATE INDEX IF NOT EXISTS findings_severity ON findings (severity);
+        CREATE INDEX IF NOT EXISTS findings_path ON findings (path);
+        CREATE INDEX IF NOT EXISTS findings_fingerprint ON findings (fingerprint);
+    """
+
+    def __init__(self, filename=None):
+        import sqlite3
+
+        filename = filename or self.DEFAULT_PATH
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        # Batch workers record their runs concurrently
+        self.db = sqlite3.connect(filename, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(self.SCHEMA)
+
+    def record_run(self, project, high, medium, low, report=None, mode="full"):
+        """Store the findings of one run and return its id"""
+        import time
+
+        with self.db:
+            run_id = self.db.execute(
+                "INSERT INTO runs (project, started_at, report, mode, findings) VALUES (?, ?, ?, ?, ?)",
+                (project, time.time(), report, mode, len(high) + len(medium) + len(low)),
+            ).lastrowid
+            self.db.executemany(
+                "INSERT INTO findings (run_id, project, severity, rule, path, line, fingerprint, confidence,"
+                " detail, reference, code) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((run_id, project, severity, finding.category, getattr(finding, 'path', ''),
+                  getattr(finding, 'line', None),
+                  getattr(finding, 'fingerprint', None) or fingerprint(finding.category, '', finding.code),
+                  getattr(finding, 'confidence', ''), getattr(finding, 'detail', finding.description),
+                  finding.reference, finding.code)
+                 for severity, findings in (("high", high), ("medium", medium), ("low", low))
+                 for finding in findings),
+            )
+        return run_id
+
+    def latest_run(self, project):
+        row = self.db.execute(
+            "SELECT id FROM runs WHERE project = ? ORDER BY started_at DESC LIMIT 1", (project,)).fetchone()
+        return row[0] if row else None
+
+    def project_of_run(self, run_id):
+        row = self.db.execute("SELECT project FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def load_run(self, run_id):
+        """The findings of a run as (high, medium, low), in the order they were recorded"""
+        intern = sys.intern
+        sections = {"high": [], "medium": [], "low": []}
+        rows = self.db.execute(
+            "SELECT severity, rule, path, detail, reference, code, confidence, line, fingerprint FROM findings"
+            " WHERE run_id = ? ORDER BY rowid", (run_id,))
+        for severity, rule, path, detail, reference, code, confidence, line, fingerprint in rows:
+            sections[severity].append(CompactFinding(
+                intern(rule), intern(path), intern(detail), intern(reference), code, confidence,
+                "?" if line is None else line, fingerprint))
+        return sections["high"], sections["medium"], sections["low"]
+
+    def rule_locations(self, rule):
+        """Where a rule fires in the latest run of every project: (project, path, line, severity) rows"""
+        return self.db.execute(
+            "SELECT f.project, f.path, f.line, f.severity FROM findings f"
+            " JOIN (SELECT project, MAX(started_at) AS started_at FROM runs GROUP BY project) latest"
+            "   ON latest.project = f.project"
+            " JOIN runs r ON r.id = f.run_id AND r.started_at = latest.started_at"
+            " WHERE f.rule = ? ORDER BY f.project, f.path, f.line", (rule,),
+        ).fetchall()
+
+    def close(self):
+        self.db.close()
+
+# Print where a rule fires across every project in the findings database
+def print_rule_locations(db_path, rule):
+    db = FindingsDB(db_path)
+    try:
+        rows = db.rule_locations(rule)
+    finally:
+        db.close()
+    for project, path, line, severity in rows:
+        print(f"{project}\t{path}:{line}\t{severity}")
+    print(f"{len(rows)} findings of {rule} in {len({row[0] for row in rows})} projects")
+
+# Per-run summaries (counts per severity and rule) kept next to the reports, one JSON object per line
+RUN_INDEX = "runs.jsonl"
+
+def run_index_path(filename):
+    return os.path.join(os.path.dirname(filename) or ".", RUN_INDEX)
+
+# Compact summary of one run; grouped findings count every occurrence
+def summarize_run(project_name, outputs, high, medium, low):
+    from datetime import datetime
+    from collections import Counter
+
+    rules = Counter()
+    for finding in high + medium + low:
+        rules[finding.category] += getattr(finding, 'count', 1)
+    return {
+        'project': project_name,
+        'time': datetime.now().strftime("%Y-%m-%d %H:%M"),
+        'reports': [os.path.basename(output) for output in outputs],
+        'high': count_findings(high),
+        'medium': count_findings(medium),
+        'low': count_findings(low),
+        'rules': dict(rules),
+    }
+
+def append_run_summary(filename, summary):
+    with open(run_index_path(filename), 'a') as f:
+        f.write(json.dumps(summary, separators=(',', ':')) + "\n")
+
+# Lines of a file from the last one backwards, reading only as many blocks as are consumed
+def iter_lines_reversed(filename, block_size=65536):
+    with open(filename, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        tail = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + tail).split(b"\n")
+            # The first piece may be the end of a line that starts in an earlier block
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode('utf-8')
+        if tail.strip():
+            yield tail.decode('utf-8')
+
+# The last `count` run summaries of a project stored next to `filename`, oldest first
+def load_recent_runs(filename, project_name, count):
+    index_path = run_index_path(filename)
+    if count <= 0 or not os.path.exists(index_path):
+        return []
+    runs = []
+    for line in iter_lines_reversed(index_path):
+        try:
+            summary = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # A run interrupted while appending
+        if summary.get('project') == project_name:
+            runs.append(summary)
+            if len(runs) == count:
                 break
-        
-        # Clean up and add ellipsis if truncated
-        summary = summary.strip()
-        if len(summary) < len(text):
-            summary += " [Full description available in scan output]"
-        
-        return summary
-
-    # Optimize text layout to better utilize available space
-    def optimize_text_layout(self, text, max_width, line_height=6):
-        """Optimize text layout to minimize unnecessary line breaks and reduce wasted space"""
-        # Use consistent character width calculation
-        chars_per_line = int(max_width / 1.7)  # Updated from 1.6 to 1.7
-        
-        if len(text) <= chars_per_line:
-            return text
-        
-        # Split text into words and build optimized lines
-        words = text.split()
-        lines = []
-        current_line = ""
-        
-        for i, word in enumerate(words):
-            # Check if adding this word would exceed the line width
-            test_line = current_line + " " + word if current_line else word
-            
-            if len(test_line) <= chars_per_line:
-                # Word fits on current line
-                current_line = test_line
-            else:
-                # Word doesn't fit, but check if we can optimize the current line
-                if current_line:
-                    # Check if current line has significant wasted space
-                    wasted_space = chars_per_line - len(current_line)
-                    
-                    # If wasted space is more than 20% of line width, try to fit more words
-                    if wasted_space > chars_per_line * 0.2:
-                        # Look ahead to see if we can fit more words
-                        remaining_words = words[i:]
-                        temp_line = current_line
-                        
-                        for next_word in remaining_words:
-                            test_temp = temp_line + " " + next_word
-                            if len(test_temp) <= chars_per_line:
-                                temp_line = test_temp
-                            else:
-                                break
-                        
-                        # If we found a better line, use it
-                        if len(temp_line) > len(current_line):
-                            current_line = temp_line
-                            # Skip the words we just added
-                            i += len(temp_line.split()) - len(current_line.split()) - 1
-                    
-                    # Add the optimized line
-                    lines.append(current_line)
-                    current_line = word
-                else:
-                    # Start new line
-                    current_line = word
-        
-        # Add the last line if there's content
-        if current_line:
-            lines.append(current_line)
-        
-        return '\n'.join(lines)
-
-    # Specialized method for category text to prevent unnecessary line breaks
-    def optimize_category_text(self, text, max_width, line_height=6):
-        """Optimize category text to prevent line breaks for hyphenated terms"""
-        # For categories, we want to keep hyphenated terms together
-        if '-' not in text:
-            # No hyphens, use normal optimization
-            return self.optimize_text_layout(text, max_width, line_height)
-        
-        # Check if the entire category fits on one line
-        chars_per_line = int(max_width / 1.7)
-        if len(text) <= chars_per_line:
-            return text
-        
-        # If it doesn't fit, be very conservative about breaking
-        # Only break if the text is significantly longer than the line width
-        if len(text) > chars_per_line * 1.5:  # Only break if 50% longer than line width
-            # Try to break at dots (.) but be very careful
-            if '.' in text:
-                parts = text.split('.')
-                if len(parts) == 2:
-                    # Only two parts, try to keep them together if possible
-                    if len(parts[0]) + len(parts[1]) + 1 <= chars_per_line * 1.3:
-                        return text  # Keep together
-                
-                # Multiple parts, try minimal breaking
-                lines = []
-                current_line = ""
-                
-                for part in parts:
-                    test_line = current_line + "." + part if current_line else part
-                    
-                    if len(test_line) <= chars_per_line:
-                        current_line = test_line
-                    else:
-                        if current_line:
-                            lines.append(current_line)
-                        current_line = part
-                
-                if current_line:
-                    lines.append(current_line)
-                
-                # If we only have one line or the result is not significantly better, return original
-                if len(lines) <= 1 or len(lines) == 2 and len(text) <= chars_per_line * 1.3:
-                    return text
-                
-                return '\n'.join(lines)
-        
-        # If we get here, the text is not long enough to warrant breaking
-        # Return the original text to preserve structure
-        return text
-
-    # Specialized method for Affected Lines to handle code snippets properly
-    def optimize_affected_lines(self, text, max_width, line_height=6):
-        """Optimize Affected Lines to handle code snippets and prevent overflow"""
-        # For code snippets, we need to be more careful about line breaks
-        chars_per_line = int(max_width / 1.7)
-        
-        if '\n' in text:
-            # Multi-line code snippet
-            lines = text.split('\n')
-            optimized_lines = []
-            
-            for line in lines:
-                if len(line) <= chars_per_line:
-                    # Line fits, keep as is
-                    optimized_lines.append(line)
-                else:
-                    # Line is too long, need to break it
-                    if len(line) > chars_per_line * 2:
-                        # Very long line, truncate with ellipsis
-                        optimized_lines.append(line[:chars_per_line] + "...")
-                    else:
-                        # Moderately long line, try to break at spaces
-                        words = line.split()
-                        current_line = ""
-                        
-                        for word in words:
-                            test_line = current_line + " " + word if current_line else word
-                            if len(test_line) <= chars_per_line:
-                                current_line = test_line
-                            else:
-                                if current_line:
-                                    optimized_lines.append(current_line)
-                                current_line = word
-                        
-                        if current_line:
-                            optimized_lines.append(current_line)
-            
-            # Limit to reasonable number of lines to prevent cell overflow
-            if len(optimized_lines) > 4:
-                return '\n'.join(optimized_lines[:4]) + "\n[Additional lines available in scan output]"
+    runs.reverse()
+    return runs
+
+# Targets passed to one semgrep process, so the command line stays within OS limits
+TARGETS_PER_SCAN = 500
+
+# Run one semgrep process per list of targets, `workers` of them at a time.
+# `done` is called after each process, e.g. to advance a progress bar.
+def scan_chunks(path, chunks, jobs=None, config=None, workers=1, done=None):
+    """Return the results and errors of every chunk, in chunk order"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    workers = max(1, min(workers, len(chunks)))
+    if workers > 1:
+        # Split the CPUs between the processes unless --scan-jobs (or --jobs) was given
+        jobs = jobs or (config and config.jobs) or max(1, (os.cpu_count() or 1) // workers)
+
+    def scan_chunk(targets):
+        process, stderr_reader = start_semgrep(path, config, targets, jobs)
+        stdout = process.stdout.read().decode("utf-8", errors="replace")
+        finish_semgrep(process, stderr_reader)
+        if done is not None:
+            done()
+        try:
+            json_data = json.loads(stdout)
+        except json.JSONDecodeError:
+            print("Warning: Could not parse semgrep JSON output")
+            return [], [{'path': name, 'message': 'semgrep output could not be parsed'} for name in targets]
+        return json_data.get('results', []), json_data.get('errors', [])
+
+    results = []
+    errors = []
+    # Semgrep does the work in its own processes, so threads are enough to drive them
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_results, chunk_errors in executor.map(scan_chunk, chunks):
+            results.extend(chunk_results)
+            errors.extend(chunk_errors)
+    return results, errors
+
+# Run semgrep on an explicit list of files, in chunks that fit on a command line.
+# With several workers the chunks run as concurrent semgrep processes.
+def scan_files(path, files, jobs=None, config=None, workers=1):
+    chunks = [files[start:start + TARGETS_PER_SCAN] for start in range(0, len(files), TARGETS_PER_SCAN)]
+    return scan_chunks(path, chunks, jobs, config, workers)
+
+# Share of changed files above which the cache runs one semgrep scan of the whole project
+FULL_SCAN_SHARE = 0.5
+
+# Scan only files that changed since the last run and merge in cached results
+def scan_cached(path, project_name, show_progress=True, config=None):
+    cache = ScanCache(project_name, get_ruleset_version(path, config))
+    try:
+        files = list_project_files(path)
+        results = []
+        changed = {}
+
+        for name in files:
+            content_hash, stat = cache.file_hash(path, name)
+            cached = cache.lookup(name, content_hash)
+            if cached is None:
+                changed[name] = (content_hash, stat)
             else:
-                return '\n'.join(optimized_lines)
+                results.extend(cached)
+
+        if len(changed) > len(files) * FULL_SCAN_SHARE:
+            # A cold cache or a large rebase: one semgrep run loads the rules once instead of once per chunk
+            print(f"Cache: {len(changed)} of {len(files)} files changed, scanning the whole project")
+            scan_data = scan(path, show_progress, config)
+            if not isinstance(scan_data, dict):
+                # Nothing can be attributed to files, so nothing is cached
+                scan_data = {'results': [], 'errors': [{'path': name, 'message': 'semgrep output could not be parsed'}
+                                                   for name in changed]}
+            new_results, errors = scan_data['results'], scan_data.get('errors', [])
+            # The full scan covers the unchanged files as well
+            results = []
         else:
-            # Single line, use normal optimization
-            if len(text) <= chars_per_line:
-                return text
-            else:
-                # Long single line, truncate appropriately
-                return text[:chars_per_line] + "..." if len(text) > chars_per_line else text
-
-    # Calculate the height needed for text in a given width
-    def calculate_text_height(self, text, width, line_height=6):  # Changed default from 10 to 6
-        # Calculate how many lines the text will actually take with word wrapping
-        # Use consistent character width calculation
-        chars_per_line = int(width / 1.7)  # Updated from 1.6 to 1.7
-        
-        if len(text) <= chars_per_line:
-            return line_height
-        
-        # Split text into words and calculate actual lines needed
-        words = text.split()
-        lines = 1  # Start with 1 line
-        current_line_length = 0
-        
-        for word in words:
-            # Add space if not first word
-            word_with_space = " " + word if current_line_length > 0 else word
-            
-            if current_line_length + len(word_with_space) <= chars_per_line:
-                # Word fits on current line
-                current_line_length += len(word_with_space)
-            else:
-                # Word doesn't fit, start new line
-                lines += 1
-                current_line_length = len(word)
-        
-        # Calculate total height needed
-        total_height = lines * line_height
-        
-        # Ensure minimum height
-        return max(total_height, line_height)
-
-    # Check if there's enough space on the current page for a table row
-    def check_page_break(self, required_height):
-        # Get current Y position and page height
-        current_y = self.get_y()
-        page_height = self.h
-        margin = 25  # Bottom margin - increased for better spacing
-        
-        # Check if adding the required height would exceed the page
-        if current_y + required_height > page_height - margin:
-            return True  # Need page break
-        return False  # Enough space
-
-    # Check if there's enough space for a section header
-    def check_header_space(self, header_height=15):
-        return self.check_page_break(header_height)
-
-    # Ensure proper table positioning within margins
-    def ensure_table_position(self):
-        # Reset to proper left margin for tables
-        self.set_x(20)
-        # Ensure we have enough space from top
-        if self.get_y() < 40:  # Account for header
-            self.set_y(40)
-
-    # Get available width for content (respecting margins)
-    def get_available_width(self):
-        return self.w - 40  # Page width minus left and right margins
-
-    # Create a table cell with proper vertical alignment
-    def create_aligned_cell(self, width, height, text, border=1, align='C', fill=False):
-        # Calculate vertical center position for the text
-        text_height = 10  # Height of single line text
-        y_offset = (height - text_height) / 2
-        
-        # Store current position
-        current_x = self.get_x()
-        current_y = self.get_y()
-        
-        # Draw the cell border
-        self.cell(width, height, '', border, ln=0, fill=fill)
-        
-        # Position text in the center of the cell
-        self.set_xy(current_x, current_y + y_offset)
-        self.cell(width, text_height, text, 0, align=align, ln=0)
-        
-        # Don't change position - let the calling method control it
-        # This ensures table continuity
-
-    # Create a multi_cell with exact height control
-    def create_exact_height_cell(self, width, height, text, border=1, fill=False):
-        # Store current position
-        current_x = self.get_x()
-        current_y = self.get_y()
-        
-        # Draw the cell border with exact height
-        self.cell(width, height, '', border, ln=0, fill=fill)
-        
-        # Calculate line height to fit text within the exact height
-        line_height = 6  # Reduced line height for tighter spacing
-        max_lines = int(height / line_height)
-        
-        # Use multi_cell but limit to the exact height
-        self.set_xy(current_x, current_y)
-        self.multi_cell(width, line_height, text, 0, fill=fill)
-        
-        # Don't change position - let the calling method control it
-        # This ensures table continuity
-
-    # Old code, to write the findings directly not in a table format
-    # def write_findings(self, findings,type):
-    #     if findings:
-    #         self.multi_cell(200, 10, txt= type + " Severity Level")
-    #         for finding in findings:
-    #             self.multi_cell(200, 10, txt="Category: " + self.clean_text(str(finding.category)))
-    #             self.multi_cell(200, 10, txt="Description: " + self.clean_text(str(finding.description))) 
-    #             self.multi_cell(200, 10, txt="Reference: " + self.clean_text(str(finding.reference)))
-    #             self.multi_cell(200, 10, txt="Affected Lines: " + self.clean_text(str(finding.code)))
-    #             self.ln(1)
-
-    # Function to create and write table
-    def create_table(self,text, data, is_severity=False):
-        self.set_font('Arial', '', 10)
-        self.set_fill_color(255, 255, 255)
-
-        if is_severity:
-            if data == "High":
-                self.set_fill_color(255, 204, 204)
-            elif data == "Medium":
-                self.set_fill_color(255, 255, 204)
-            elif data == "Low":
-                self.set_fill_color(204, 255, 204)
-        
-        # Use full text instead of aggressive truncation
-        display_data = str(data)
-        
-        # For descriptions, check if they're extremely long and create smart summaries
-        if text == "Category" and '-' in str(data):
-            # For categories with hyphens, treat them as single units to prevent line breaks
-            display_data = str(data)
-        elif text == "Description" and len(display_data) > 500:  # Very long descriptions
-            display_data = self.create_smart_summary(display_data)
-        elif text == "Reference" and len(display_data) > 300:  # Long references
-            display_data = self.create_smart_summary(display_data, max_lines=4, chars_per_line=60)
-        elif text == "Affected Lines" and len(display_data) > 200:  # Long code snippets
-            # For code, try to show the most relevant part
-            if '\n' in display_data:
-                lines = display_data.split('\n')
-                if len(lines) > 3:
-                    display_data = '\n'.join(lines[:3]) + "\n[Additional lines available in scan output]"
+            print(f"Cache: {len(files) - len(changed)} unchanged files, scanning {len(changed)} changed files")
+            new_results, errors = scan_files(path, list(changed), config=config, workers=os.cpu_count() or 1) \
+                if changed else ([], [])
+
+        # Group the new results per file so each file gets its own cache entry
+        by_file = {name: [] for name in changed}
+        for result in new_results:
+            by_file.setdefault(os.path.normpath(result.get('path', '')), []).append(result)
+
+        # Files semgrep reported errors for are not cached so they are retried next run
+        failed = {os.path.normpath(error['path']) for error in errors if error.get('path')}
+        for name, (content_hash, stat) in changed.items():
+            if name not in failed:
+                cache.store(name, content_hash, stat, by_file.get(name, []))
+
+        cache.prune(files)
+        results.extend(new_results)
+    finally:
+        cache.close()
+
+    results.sort(key=lambda result: (result.get('path', ''), result.get('start', {}).get('line', 0)))
+    return {'results': results, 'errors': errors}
+
+# Split a project into at most `shards` lists of scan targets of similar total size
+def partition_project(path, shards):
+    import heapq
+
+    files = list_project_files(path)
+    sizes = [(name.replace(os.sep, '/'), os.path.getsize(os.path.join(path, name))) for name in files]
+    share = sum(size for _, size in sizes) / max(shards, 1)
+
+    # Top-level entries become targets; a directory bigger than an even share is split into its children
+    units = []
+    pending = [("", sizes)]
+    while pending:
+        prefix, members = pending.pop()
+        entries = {}
+        for name, size in members:
+            head, _, rest = name[len(prefix):].partition('/')
+            # Files directly inside `prefix` are grouped under None and become file targets
+            entries.setdefault(prefix + head if rest else None, []).append((name, size))
+        for entry, group in entries.items():
+            group_size = sum(size for _, size in group)
+            if entry is None:
+                units.append((group_size, [name for name, _ in group]))
+            elif group_size > share and len(group) > 1:
+                pending.append((entry + '/', group))
             else:
-                display_data = display_data[:200] + "..." if len(display_data) > 200 else display_data
-        
-        # Calculate the actual height needed for the data text
-        line_height = 6  # Reduced from 10 to 6 for tighter line spacing
-        available_width = self.get_available_width()
-        data_width = available_width - int(available_width * 0.2)  # Calculate data width
-        data_height = self.calculate_text_height(display_data, data_width, line_height)
-        
-        # Apply intelligent text wrapping that respects word boundaries
-        display_data = self.truncate_text_by_height(str(display_data), data_width, data_height, line_height)
-        
-        # Use specialized optimization based on field type
-        if text == "Category":
-            # Use category-specific optimization to prevent line breaks for hyphenated terms
-            display_data = self.optimize_category_text(display_data, data_width, line_height)
-        elif text == "Affected Lines":
-            # Use Affected Lines specific optimization to handle code snippets
-            display_data = self.optimize_affected_lines(display_data, data_width, line_height)
-        else:
-            # Use specialized optimization for the second column to minimize wasted space
-            display_data = self.optimize_second_column_layout(display_data, data_width, line_height)
-        
-        # Check if we need a page break to keep the table row together
-        if self.check_page_break(data_height):
-            self.add_page()
-        
-        # Ensure we're within page margins
-        current_x = self.get_x()
-        if current_x < 20:  # Left margin
-            self.set_x(20)
-        elif current_x > self.w - 200:  # Right margin (table width is 200)
-            self.set_x(20)  # Reset to left margin
-        
-        # Calculate column widths based on available space
-        available_width = self.get_available_width()
-        label_width = int(available_width * 0.2)  # 20% for label
-        data_width = available_width - label_width  # Remaining for data
-        
-        # Store current x position
-        x_pos = self.get_x()
-        y_pos = self.get_y()
-        
-        # First column (label) - use same height as data column and center text vertically
-        self.create_aligned_cell(label_width, data_height, text, border=1, align='C', fill=False)
-        
-        # Second column (data) - use exact height control to match first column
-        self.set_xy(x_pos + label_width, y_pos)
-        self.create_exact_height_cell(data_width, data_height, display_data, border=1, fill=True)
-        
-        # Position for next row - both cells now have exactly the same height
-        # Don't use ln() as it breaks table continuity
-        self.set_xy(20, y_pos + data_height)  # Reset to left margin, move down by cell height
-
-    # The function to iterate through the available findings and write to data
-    def write_to_table(self, findings, type):
-        col_width = 50
-        if findings:
-            for i, finding in enumerate(findings):
-                # Ensure proper table positioning
-                self.ensure_table_position()
-                
-                # Calculate total height needed for this finding
-                total_height = 0
-                available_width = self.get_available_width()
-                data_width = available_width - int(available_width * 0.2)
-                total_height += self.calculate_text_height(str(finding.category), data_width, 6)
-                total_height += self.calculate_text_height(str(finding.description), data_width, 6)
-                total_height += 6  # Severity level row (reduced height)
-                total_height += self.calculate_text_height(str(finding.reference), data_width, 6)
-                
-                # Special handling for Affected Lines to account for multi-line code
-                affected_lines_text = str(finding.code)
-                if '\n' in affected_lines_text:
-                    # Multi-line code snippet
-                    lines = affected_lines_text.split('\n')
-                    # Limit to 4 lines maximum to prevent overflow
-                    limited_lines = lines[:4]
-                    affected_lines_text = '\n'.join(limited_lines)
-                    if len(lines) > 4:
-                        affected_lines_text += "\n[Additional lines available in scan output]"
-                
-                total_height += self.calculate_text_height(affected_lines_text, data_width, 6)
-                total_height += 15  # Add spacing between rows
-                
-                # Check if we need a page break to keep the entire finding together
-                if self.check_page_break(total_height):
-                    self.add_page()
-                    self.ensure_table_position()  # Reset position on new page
-                
-                self.create_table("Category",self.clean_text(str(finding.category)))
-                self.create_table("Description",self.clean_text(str(finding.description)))
-                self.create_table("Severity Level", type, is_severity=True)
-                self.create_table("Reference",self.clean_text(str(finding.reference)))
-                self.create_table("Affected Lines",self.clean_text(str(finding.code)))
-                
-                # Add spacing between findings while maintaining table structure
-                if i < len(findings) - 1:
-                    # Add space between findings but keep table structure
-                    current_y = self.get_y()
-                    self.set_xy(20, current_y + 5)  # Small gap between findings
-                else:
-                    # Last finding - add final spacing
-                    current_y = self.get_y()
-                    self.set_xy(20, current_y + 3)
+                units.append((group_size, [entry]))
 
+    # Largest units first, each to the currently smallest shard
+    loads = [(0, i, []) for i in range(max(shards, 1))]
+    for size, targets in sorted(units, key=lambda unit: unit[0], reverse=True):
+        load, i, shard_targets = heapq.heappop(loads)
+        shard_targets.extend(targets)
+        heapq.heappush(loads, (load + size, i, shard_targets))
+    return [targets for _, _, targets in sorted(loads, key=lambda load: load[1]) if targets]
 
-# Scan the code for vulnerability using semgrep cli
-def scan(path):
-    import os
-    import json
-    
-    # Store current working directory
-    original_cwd = os.getcwd()
-    
+# Key identifying a finding regardless of which shard reported it
+def result_key(result):
+    start, end = result.get('start', {}), result.get('end', {})
+    return (result.get('check_id'), os.path.normpath(result.get('path', '')),
+            start.get('line'), start.get('col'), end.get('line'), end.get('col'))
+
+# Scan a project as several semgrep processes over parts of the tree and merge their output
+def scan_sharded(path, shards, jobs=None, show_progress=True, config=None):
+    partitions = partition_project(path, shards)
+    # Each shard is one semgrep process, unless it has more targets than fit on a command line
+    chunks = [targets[start:start + TARGETS_PER_SCAN]
+              for targets in partitions for start in range(0, len(targets), TARGETS_PER_SCAN)]
+
+    progress = scan_progress() if show_progress else None
+    done = None
+    if progress is not None:
+        task = progress.add_task(f"Scanning {len(partitions)} shards", total=len(chunks))
+        done = lambda: progress.advance(task)
     try:
-        # Change to the project directory
-        os.chdir(path)
-        print(f"Changed to directory: {path}")
-        
-        # Run semgrep from the project directory with JSON output
-        command = "semgrep scan . --json"
-        
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[bold blue]{task.description}"),
-        ) as progress:
-            task = progress.add_task("Scanning...", total=None)  
-            
-            # Run the subprocess command
-            result = subprocess.run(command, capture_output=True, text=True, shell=True)
-
-            progress.update(task, completed=1) 
-            progress.update(task, description="Done")  
-        
-        # Check if semgrep command was successful
-        if result.returncode != 0:
-            print(f"Warning: Semgrep command failed with return code {result.returncode}")
-            if result.stderr:
-                print(f"Error output: {result.stderr}")
-            # Still try to parse the output in case there are partial results
-        
-        # Parse JSON output
-        try:
-            json_data = json.loads(result.stdout)
-            # Validate that we have the expected structure
-            if 'results' in json_data and isinstance(json_data['results'], list):
-                return json_data
-            else:
-                print("Warning: Semgrep JSON output doesn't have expected 'results' structure, falling back to text parsing")
-                return result.stdout
-        except json.JSONDecodeError:
-            print("Warning: Could not parse semgrep JSON output, falling back to text parsing")
-            return result.stdout
-        
+        results, errors = scan_chunks(path, chunks, jobs, config, len(partitions), done)
     finally:
-        # Always restore the original working directory
-        os.chdir(original_cwd)
-        print(f"Restored to directory: {original_cwd}")
+        if progress is not None:
+            progress.stop()
+
+    # Shards don't overlap, but symlinks and explicitly listed files can make semgrep report a finding twice
+    unique = {}
+    for result in results:
+        unique.setdefault(result_key(result), result)
+    unique_errors = {}
+    for error in errors:
+        unique_errors.setdefault(json.dumps(error, sort_keys=True), error)
+
+    merged = sorted(unique.values(), key=lambda result: (result.get('path', ''), result.get('start', {}).get('line', 0)))
+    return {'results': merged, 'errors': list(unique_errors.values())}
+
+# Files changed since a git ref (committed, staged, unstaged or untracked), relative to the project
+def changed_files(path, ref):
+    try:
+        diff = subprocess.run(["git", "diff", "--name-only", "--relative", "-z", ref], cwd=path, capture_output=True)
+        if diff.returncode != 0:
+            raise RuntimeError(f"git diff against '{ref}' failed: {diff.stderr.decode('utf-8', 'replace').strip()}")
+        untracked = subprocess.run(["git", "ls-files", "-z", "--others", "--exclude-standard"], cwd=path, capture_output=True)
+    except OSError as e:
+        raise RuntimeError(f"could not run git for --since: {e}")
+    names = (diff.stdout + b"\0" + untracked.stdout).decode("utf-8", "replace").split("\0")
+    return sorted({os.path.normpath(name) for name in names if name})
+
+# Stable identity of a finding across scans: rule, path and whitespace-normalized code.
+# Line numbers are left out so findings don't count as new when code above them moves.
+def finding_fingerprint(result):
+    extra = result.get('extra', {})
+    code = extra.get('lines', '')
+    if not code or code == "requires login":
+        code = extra.get('message', '')
+    return fingerprint(result.get('check_id', ''), result.get('path', ''), code)
+
+def fingerprint(rule, path, code):
+    key = "\0".join([rule, os.path.normpath(path), " ".join(code.split())])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+# Compare two result lists by fingerprint; `scope` limits the comparison to these paths
+def diff_results(baseline, current, scope=None):
+    """Return (new, fixed, unchanged_count)"""
+    from collections import Counter
+
+    compared = [result for result in baseline
+                if scope is None or os.path.normpath(result.get('path', '')) in scope]
+
+    # Fingerprints are counted, so a rule matching the same code twice in a file is two findings
+    remaining = Counter(finding_fingerprint(result) for result in compared)
+    new = []
+    for result in current:
+        key = finding_fingerprint(result)
+        if remaining[key]:
+            remaining[key] -= 1
+        else:
+            new.append(result)
+
+    found = Counter(finding_fingerprint(result) for result in current)
+    fixed = []
+    for result in compared:
+        key = finding_fingerprint(result)
+        if found[key]:
+            found[key] -= 1
+        else:
+            fixed.append(result)
+
+    # Findings outside the scope were not rescanned and are carried over from the baseline
+    unchanged = len(current) - len(new) + len(baseline) - len(compared)
+    return new, fixed, unchanged
+
+# Scan what changed and compare it with a baseline scan (a saved JSON/SARIF file, or "cache")
+def scan_baseline(path, project_name, baseline, since=None, show_progress=True, config=None):
+    """Return a dict with the new and fixed results, the unchanged count and what was compared"""
+    if baseline == "cache":
+        cache = ScanCache(project_name, get_ruleset_version(path, config))
+        try:
+            baseline_results = cache.all_results()
+        finally:
+            cache.close()
+    else:
+        baseline_results = load_scan_files([baseline])['results']
+
+    if since:
+        # Only files changed since the ref are scanned; findings anywhere else are unchanged
+        scope = set(changed_files(path, since))
+        targets = [name for name in sorted(scope) if os.path.isfile(os.path.join(path, name))]
+        print(f"Baseline: {len(scope)} files changed since {since}, scanning {len(targets)}")
+        current = scan_files(path, targets, config=config)[0] if targets else []
+    else:
+        scope = None
+        scan_data = scan(path, show_progress, config)
+        current = scan_data['results'] if isinstance(scan_data, dict) else []
+
+    new, fixed, unchanged = diff_results(baseline_results, current, scope)
+    return {
+        'baseline': "result cache" if baseline == "cache" else os.path.basename(baseline),
+        'since': since,
+        'new': new,
+        'fixed': fixed,
+        'unchanged': unchanged,
+    }
+
+# Convert a SARIF result to the semgrep JSON result shape used by parse_result()
+def sarif_to_semgrep_result(result, rules):
+    rule_id = result.get('ruleId', 'Unknown')
+    rule = rules.get(rule_id, {})
+
+    # SARIF levels map onto semgrep severities; fall back to the rule default
+    level = result.get('level') or rule.get('defaultConfiguration', {}).get('level', 'error')
+    severity = {'error': 'ERROR', 'warning': 'WARNING'}.get(level, 'INFO')
+
+    locations = result.get('locations') or [{}]
+    physical = locations[0].get('physicalLocation', {})
+    region = physical.get('region', {})
+    start_line = region.get('startLine', '')
+
+    metadata = {}
+    tags = rule.get('properties', {}).get('tags', [])
+    cwe = [tag for tag in tags if tag.startswith('CWE')]
+    if cwe:
+        metadata['cwe'] = cwe
+    help_uri = rule.get('helpUri', '')
+    if help_uri:
+        metadata['source'] = help_uri
+
+    return {
+        'check_id': rule_id,
+        'path': physical.get('artifactLocation', {}).get('uri', ''),
+        'start': {'line': start_line},
+        'end': {'line': region.get('endLine', start_line)},
+        'extra': {
+            'message': result.get('message', {}).get('text', ''),
+            'severity': severity,
+            'lines': region.get('snippet', {}).get('text', ''),
+            'metadata': metadata,
+        },
+    }
+
+# Yield semgrep-shaped results from a decoded SARIF document
+def iter_sarif_results(sarif):
+    for run in sarif.get('runs', []):
+        driver = run.get('tool', {}).get('driver', {})
+        rules = {rule.get('id'): rule for rule in driver.get('rules', [])}
+        for result in run.get('results', []):
+            yield sarif_to_semgrep_result(result, rules)
+
+# Yield results from saved semgrep JSON or SARIF files without re-running the scan
+def iter_scan_files(filenames, errors=None):
+    import mmap
+
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                print(f"Warning: {filename} is empty, skipping")
+                continue
+            # Memory-map the file so large scans are paged in on demand
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                parser = SemgrepResultParser()
+                try:
+                    yield from iter_semgrep_results(mapped, parser)
+                except ValueError as e:
+                    print(f"Warning: Could not parse {filename}: {e}")
+                    continue
+
+        # SARIF documents have no top-level 'results'; their results live under 'runs'
+        if parser.result_count == 0 and 'runs' in parser.metadata:
+            yield from iter_sarif_results(parser.metadata)
+        elif errors is not None:
+            errors.extend(parser.metadata.get('errors', []))
+
+# Load saved semgrep JSON or SARIF files into a single semgrep-shaped document
+def load_scan_files(filenames):
+    errors = []
+    results = list(iter_scan_files(filenames, errors))
+    return {'results': results, 'errors': errors}
+
+# Build a compact finding from one semgrep JSON result
+def make_finding(result):
+    intern = sys.intern
+    return CompactFinding(
+        intern(result.get('check_id', 'Unknown').strip()),
+        intern(result.get('path', '')),
+        intern(result_detail(result)),
+        intern(result_reference(result).strip()),
+        result_code(result).strip(),
+        intern(str(result.get('extra', {}).get('metadata', {}).get('confidence', '')).upper()),
+        result.get('start', {}).get('line', '?'),
+        finding_fingerprint(result),
+    )
+
+# Build findings one result at a time, without keeping the raw JSON around
+def collect_findings(results, group_by=None):
+    high_findings = []
+    medium_findings = []
+    low_findings = []
+    findings_by_severity = {"high": high_findings, "medium": medium_findings, "low": low_findings}
+
+    # Index of groups by (severity, rule, message, reference[, path]) so grouping stays O(n)
+    groups = {}
+
+    for result in results:
+        severity = result_severity(result)
+        finding = make_finding(result)
+        if group_by is None:
+            findings_by_severity[severity].append(finding)
+            continue
+
+        add_to_group(groups, findings_by_severity[severity], severity, finding, group_by)
+
+    if group_by is not None:
+        # Largest groups first within each severity
+        for findings_list in findings_by_severity.values():
+            findings_list.sort(key=lambda group: group.count, reverse=True)
+
+    return high_findings, medium_findings, low_findings
+
+# Add a finding to its group, creating the group at the end of `findings_list` on first use
+def add_to_group(groups, findings_list, severity, finding, group_by):
+    if group_by == "file":
+        key = (severity, finding.category, finding.detail, finding.reference, finding.path)
+    else:
+        key = (severity, finding.category, finding.detail, finding.reference)
+    group = groups.get(key)
+    if group is None:
+        description = finding.description if group_by == "file" else finding.detail
+        group = groups[key] = FindingGroup(finding.category, description, finding.reference, finding.confidence)
+        findings_list.append(group)
+    group.occurrences.append((finding.path, finding.line))
+
+# Findings parsed from semgrep's text output carry no path or line and can't be grouped
+def warn_ungroupable(group_by):
+    print(f"Warning: --group-by {group_by} needs semgrep JSON output; findings parsed from text output are not grouped")
+
+# Group findings that were built ungrouped (e.g. to be recorded individually first)
+def group_findings(high, medium, low, group_by):
+    if any(isinstance(finding, Findings) for findings in (high, medium, low) for finding in findings):
+        warn_ungroupable(group_by)
+        return high, medium, low
+
+    groups = {}
+    grouped = {"high": [], "medium": [], "low": []}
+    for severity, findings in (("high", high), ("medium", medium), ("low", low)):
+        for finding in findings:
+            add_to_group(groups, grouped[severity], severity, finding, group_by)
+    for findings_list in grouped.values():
+        findings_list.sort(key=lambda group: group.count, reverse=True)
+    return grouped["high"], grouped["medium"], grouped["low"]
+
+# Build the severity lists in a single pass over the scan output
+def build_findings(scan_data, group_by=None):
+    if isinstance(scan_data, dict) and 'results' in scan_data:
+        return collect_findings(scan_data['results'], group_by)
+
+    # Fallback to original text parsing for backward compatibility
+    if group_by is not None:
+        warn_ungroupable(group_by)
+    category, description, reference, code = categorize_finding(scan_data)
+    return store_finding(category, description, reference, code, scan_data)
+
+# Parse --format: comma separated report formats, e.g. "pdf,html"
+def parse_report_formats(value):
+    formats = tuple(dict.fromkeys(part.strip().lower() for part in value.split(',') if part.strip()))
+    unknown = [name for name in formats if name != "pdf" and name not in REPORT_WRITERS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(
+            f"invalid format '{value}', expected a list of {', '.join(('pdf',) + tuple(REPORT_WRITERS))}")
+    return formats
+
+# Parse --max-per-severity: either one limit for every severity or "high=100,medium=50,low=20"
+def parse_severity_limits(value):
+    levels = ("High", "Medium", "Low")
+    if value.isdigit():
+        return {level: int(value) for level in levels}
+
+    limits = {}
+    for part in value.split(','):
+        name, _, number = part.partition('=')
+        level = name.strip().capitalize()
+        if level not in levels or not number.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"invalid severity limit '{part}', expected e.g. high=100,medium=50")
+        limits[level] = int(number)
+    return limits
+
+# Flat record of a finding for JSONL output
+def finding_to_record(finding, level):
+    record = {
+        'severity': level,
+        'rule': finding.category,
+        'description': finding.description,
+        'reference': finding.reference,
+        'confidence': getattr(finding, 'confidence', ''),
+    }
+    if isinstance(finding, FindingGroup):
+        record['occurrences'] = [f"{path}:{line}" for path, line in finding.occurrences]
+    else:
+        record['path'] = getattr(finding, 'path', '')
+        record['line'] = getattr(finding, 'line', '')
+        record['code'] = finding.code
+    return record
+
+# Order in which findings are kept when a severity section is capped
+CONFIDENCE_RANK = {"HIGH": 0, "MEDIUM": 1, "LOW": 2}
+
+# Choose which findings of one severity are rendered when the section is capped
+def sample_findings(findings, limit, sample="top"):
+    """Return (kept, overflow) keeping `limit` findings of the list"""
+    if len(findings) <= limit:
+        return findings, []
+
+    if sample == "stratified":
+        # Round-robin over rules so every rule keeps representatives
+        by_rule = {}
+        for index, finding in enumerate(findings):
+            by_rule.setdefault(finding.category, []).append(index)
+        chosen = []
+        depth = 0
+        while len(chosen) < limit:
+            for indexes in by_rule.values():
+                if depth < len(indexes) and len(chosen) < limit:
+                    chosen.append(indexes[depth])
+            depth += 1
+        chosen_set = set(chosen)
+    else:
+        # Highest confidence first, scan order within the same confidence
+        order = sorted(range(len(findings)),
+                       key=lambda index: CONFIDENCE_RANK.get(getattr(findings[index], 'confidence', ''), 3))
+        chosen_set = set(order[:limit])
+
+    kept = [finding for index, finding in enumerate(findings) if index in chosen_set]
+    overflow = [finding for index, finding in enumerate(findings) if index not in chosen_set]
+    return kept, overflow
+
+# Cap the findings rendered per severity; the overflow goes to a compressed JSONL sidecar
+def limit_findings(high, medium, low, limits, filename, sample="top"):
+    """Return (high, medium, low, omitted, sidecar_path) with omitted counts per severity"""
+    import gzip
+
+    sections = {"High": high, "Medium": medium, "Low": low}
+    omitted = {}
+    overflow_by_level = {}
+    for level, findings in sections.items():
+        if level in limits:
+            sections[level], overflow_by_level[level] = sample_findings(findings, limits[level], sample)
+            omitted[level] = count_findings(overflow_by_level[level])
+
+    sidecar_path = None
+    if any(overflow_by_level.values()):
+        sidecar_path = os.path.splitext(filename)[0] + ".overflow.jsonl.gz"
+        with gzip.open(sidecar_path, 'wt', encoding='utf-8') as sidecar:
+            for level, overflow in overflow_by_level.items():
+                for finding in overflow:
+                    sidecar.write(json.dumps(finding_to_record(finding, level)) + "\n")
+        print(f"{sum(omitted.values())} findings over the limits were written to {sidecar_path}")
+
+    return sections["High"], sections["Medium"], sections["Low"], omitted, sidecar_path
+
+class JobArgumentParser(argparse.ArgumentParser):
+    """Parser for the arguments of a report server job: errors are raised instead of exiting the worker"""
+
+    def error(self, message):
+        raise ValueError(message)
+
+    def exit(self, status=0, message=None):
+        raise ValueError(message or "arguments requested an exit (e.g. --help)")
 
 # Check for system arguments and extract the path
-def check_sysarg():
-    if len(sys.argv) < 2:
+def check_sysarg(argv=None, parser_class=argparse.ArgumentParser):
+    """Parse `argv` (default: the command line); a report server parses its jobs with JobArgumentParser"""
+    parser = parser_class(
+        usage="python generate.py [PATH] [OUTPUT_NAME] [options]",
+        epilog="Note: If no output name is provided, will use: reports/<project-name>/<project-name>-yyyymmddhhmm.pdf",
+    )
+    parser.add_argument("path", nargs="?", help="Project directory to scan")
+    parser.add_argument("filename", nargs="?", help="Output PDF filename")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse semgrep output incrementally instead of buffering the whole JSON document")
+    parser.add_argument("--input", action="append", metavar="FILE",
+                        help="Build the report from a saved semgrep JSON or SARIF file instead of running a scan (repeatable)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Only scan files that changed since the last run, reusing cached results from reports/<project>/.cache")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="Only report findings that are new compared to this saved semgrep JSON/SARIF scan "
+                             "('cache' uses the results of the last --cache run); fixed findings are listed too")
+    parser.add_argument("--since", metavar="REF",
+                        help="With --baseline, only scan files changed since this git ref (e.g. origin/main)")
+    parser.add_argument("--trend", nargs="?", type=int, const=10, metavar="N",
+                        help="Add a trend section covering the last N runs of the project (default: 10), "
+                             f"read from the {RUN_INDEX} summaries kept next to the reports")
+    parser.add_argument("--db", nargs="?", const=FindingsDB.DEFAULT_PATH, metavar="FILE",
+                        help=f"Record the run's findings in a SQLite findings database (default: {FindingsDB.DEFAULT_PATH})")
+    parser.add_argument("--from-db", action="store_true",
+                        help="Build the report from the latest recorded run of the project instead of scanning")
+    parser.add_argument("--run", type=int, metavar="ID", help="With --from-db, the recorded run to report on")
+    parser.add_argument("--query-rule", metavar="RULE",
+                        help="Print where a rule fires in the latest recorded run of every project and exit")
+    parser.add_argument("--scan-config", metavar="FILE",
+                        help="JSON file with semgrep options (config, jobs, max_memory, timeout, max_target_bytes, "
+                             "exclude); the flags below override it")
+    parser.add_argument("--config", action="append", metavar="RULES",
+                        help="semgrep --config (rules file, directory or registry name); repeatable")
+    parser.add_argument("--jobs", type=int, metavar="N", help="semgrep --jobs: parallel semgrep workers")
+    parser.add_argument("--max-memory", type=int, metavar="MB", help="semgrep --max-memory per file, in MB")
+    parser.add_argument("--timeout", type=int, metavar="SECONDS", help="semgrep --timeout per rule and file")
+    parser.add_argument("--max-target-bytes", type=int, metavar="BYTES", help="semgrep --max-target-bytes: skip larger files")
+    parser.add_argument("--exclude", action="append", metavar="PATTERN", help="semgrep --exclude; repeatable")
+    parser.add_argument("--scan-shards", type=int, metavar="N",
+                        help="Split the project into N parts of similar size and scan them with concurrent semgrep processes")
+    parser.add_argument("--scan-jobs", type=int, metavar="J",
+                        help="semgrep --jobs for each shard with --scan-shards (default: CPUs divided by shards)")
+    parser.add_argument("--group-by", choices=("rule", "file"),
+                        help="Collapse findings with the same rule (per file with 'file') into one table listing every occurrence")
+    parser.add_argument("--max-per-severity", type=parse_severity_limits, metavar="LIMITS",
+                        help="Render at most this many findings per severity (N, or e.g. high=200,medium=100,low=50); "
+                             "the rest go to a compressed JSONL sidecar next to the PDF")
+    parser.add_argument("--sample", choices=("top", "stratified"), default="top",
+                        help="Findings kept under --max-per-severity: highest confidence first (top) or round-robin per rule")
+    parser.add_argument("--batch", action="append", metavar="PATTERN",
+                        help="Scan several projects (directory or glob, repeatable) and write one report per project")
+    parser.add_argument("--workers", type=int, help="Number of projects scanned concurrently in batch mode")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap scanning, parsing and rendering: findings are drawn while semgrep output is still being read")
+    parser.add_argument("--line-breaking", choices=tuple(LINE_BREAKERS), default="greedy",
+                        help="How table cells are wrapped: 'greedy' fills each line (fastest), 'balanced' evens out "
+                             "line lengths (minimum raggedness)")
+    parser.add_argument("--format", type=parse_report_formats, default=("pdf",), metavar="FORMATS",
+                        help="Reports to write, comma separated: pdf, html (single file, paged in the browser), "
+                             "jsonl (one finding per line); e.g. pdf,html. Extra formats are written next to the PDF "
+                             "while it renders (default: pdf)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Smaller PDF: the header and footer are stored once and referenced by every page")
+    parser.add_argument("--render-workers", type=int, metavar="N",
+                        help="Render the findings in N processes, each chunk of findings on its own pages, and merge them")
+    parser.add_argument("--render-chunk", type=int, default=2000, metavar="SIZE",
+                        help="Findings per render worker chunk with --render-workers (default: 2000)")
+    parser.add_argument("--profile", nargs="?", const=True, metavar="TRACE",
+                        help="Record wall time, CPU time and peak RSS per pipeline stage and write them as a JSON trace "
+                             "(default: <report>.profile.json)")
+    parser.add_argument("--project", help="Project name shown in the report (defaults to the PATH or first input file name)")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="Run as a report server listening on a Unix socket path or localhost:PORT (loopback only); "
+                             "reports are requested with --submit")
+    parser.add_argument("--serve-workers", type=int, metavar="N",
+                        help="Reports generated at the same time by the server (default: CPUs, at most 4)")
+    parser.add_argument("--serve-queue", type=int, default=64, metavar="N",
+                        help="Reports the server queues behind the running ones before turning requests away (default: 64)")
+    parser.add_argument("--submit", metavar="ADDRESS",
+                        help="Have the report server at ADDRESS generate this report instead of generating it here")
+    parser.add_argument("--server-stats", metavar="ADDRESS",
+                        help="Print the queue depth and job latencies of the report server at ADDRESS as JSON and exit")
+
+    if argv is None and len(sys.argv) < 2:
         print("Usage: python generate.py [PATH] [OUTPUT_NAME]")
         print("Example: python generate.py /path/to/project/")
         print("Example: python generate.py /path/to/project/ custom-name.pdf")
         print("Note: If no output name is provided, will use: reports/<project-name>/<project-name>-yyyymmddhhmm.pdf")
         exit()
-    
-    if len(sys.argv) > 3:
-        print("Usage: python generate.py [PATH] [OUTPUT_NAME]")
-        print("Too many arguments provided.")
-        exit()
 
-    path = sys.argv[1]
-    
-    # Check if output filename was provided
-    if len(sys.argv) == 3:
-        filename = sys.argv[2]
-    else:
-        # Generate default filename
-        filename = None
-    
-    return path, filename
+    args = parser.parse_args(argv)
+
+    try:
+        args.scan = ScanConfig.load(args.scan_config, config=args.config, jobs=args.jobs, max_memory=args.max_memory,
+                                    timeout=args.timeout, max_target_bytes=args.max_target_bytes, exclude=args.exclude)
+    except (OSError, ValueError, TypeError) as e:
+        parser.error(f"--scan-config: {e}")
+
+    for flag, address in (("--serve", args.serve), ("--submit", args.submit), ("--server-stats", args.server_stats)):
+        if address:
+            try:
+                parse_server_address(address)
+            except ValueError as e:
+                parser.error(f"{flag}: {e}")
+
+    if args.render_chunk < 1:
+        parser.error("--render-chunk must be a positive number of findings")
+
+    if args.query_rule or args.serve or args.server_stats:
+        return args
+
+    if args.from_db:
+        if args.batch or args.input or args.baseline or args.pipeline:
+            parser.error("--from-db cannot be combined with --batch, --input, --baseline or --pipeline")
+        # No directory is needed: a single positional is the output name when it isn't one
+        if args.path is not None and args.filename is None and not os.path.isdir(args.path):
+            args.path, args.filename = None, args.path
+        if args.path is None and not args.project:
+            parser.error("--from-db needs PATH or --project to know which project to report on")
+        args.db = args.db or FindingsDB.DEFAULT_PATH
+    elif args.run:
+        parser.error("--run requires --from-db")
+
+    if args.batch:
+        if args.path is not None:
+            parser.error("PATH cannot be combined with --batch")
+        if args.input:
+            parser.error("--input cannot be combined with --batch: every project would report the same saved results")
+    elif args.input:
+        # Without a directory to scan, a single positional argument is the output name
+        if args.path is not None and args.filename is None and not os.path.isdir(args.path):
+            args.path, args.filename = None, args.path
+        if args.path is not None:
+            parser.error("PATH cannot be combined with --input (saved results are not rescanned); use --project to name the report")
+    elif args.path is None and not args.from_db:
+        parser.error("PATH is required")
+
+    if args.cache:
+        for flag, value in (("--input", args.input), ("--stream", args.stream)):
+            if value:
+                parser.error(f"--cache cannot be combined with {flag}")
+
+    # The pipeline renders findings in scan order as they arrive, so it runs its own scan
+    # and can't use options that need every finding first
+    if args.since and not args.baseline:
+        parser.error("--since requires --baseline")
+    if args.baseline:
+        for flag, value in (("--input", args.input), ("--cache", args.cache), ("--stream", args.stream),
+                            ("--scan-shards", args.scan_shards), ("--pipeline", args.pipeline)):
+            if value:
+                parser.error(f"--baseline cannot be combined with {flag}")
+
+    if args.scan_shards:
+        for flag, value in (("--input", args.input), ("--cache", args.cache), ("--stream", args.stream)):
+            if value:
+                parser.error(f"--scan-shards cannot be combined with {flag}")
+
+    if args.pipeline:
+        for flag, value in (("--input", args.input), ("--cache", args.cache), ("--stream", args.stream),
+                            ("--scan-shards", args.scan_shards),
+                            ("--group-by", args.group_by), ("--max-per-severity", args.max_per_severity),
+                            ("--render-workers", args.render_workers)):
+            if value:
+                parser.error(f"--pipeline cannot be combined with {flag}")
+        if "pdf" not in args.format:
+            parser.error("--pipeline renders a PDF; add pdf to --format")
+
+    # args.filename is None when no output name was provided; a default is generated later
+    return args
 
 def extract_project_name(path):
     """Extract project name from directory path"""
@@ -789,7 +1575,6 @@ def extract_project_name(path):
 
 def generate_default_output_path(project_name):
     """Generate default output path: reports/<project-name>/<project-name>-yyyymmddhhmm.pdf"""
-    import os
     from datetime import datetime
     
     # Create timestamp in yyyymmddhhmm format
@@ -828,6 +1613,85 @@ def clean_description(messages):
         combined_messages.append(temp)
     return combined_messages
 
+# Extract the description text that follows the path (message, CWE and impact)
+def result_detail(result):
+    msg = result.get('extra', {}).get('message', '')
+
+    # Get additional context from metadata if available
+    metadata = result.get('extra', {}).get('metadata', {})
+    cwe = metadata.get('cwe', [])
+    impact = metadata.get('impact', '')
+
+    detail_parts = [msg]
+    if cwe:
+        # Some rules give a single CWE string instead of a list
+        detail_parts.append(f"CWE: {cwe if isinstance(cwe, str) else ', '.join(cwe)}")
+    if impact:
+        detail_parts.append(f"Impact: {impact}")
+
+    return " - ".join(detail_parts)
+
+# Extract the reference (source URL) of a JSON result - prioritize shortlink
+def result_reference(result):
+    metadata = result.get('extra', {}).get('metadata', {})
+    ref = metadata.get('shortlink', '')
+    if not ref:
+        # Try alternative locations for the reference URL
+        ref = result.get('extra', {}).get('source', '')
+        if not ref:
+            ref = metadata.get('source', '')
+            if not ref:
+                # Try references array
+                references = metadata.get('references', [])
+                if references:
+                    ref = references[0]
+                else:
+                    ref = "Reference not available"
+    return ref
+
+# Extract the affected lines (actual code from the file) of a JSON result
+def result_code(result):
+    lines = result.get('extra', {}).get('lines', '')
+    if not lines or lines == "requires login":  # Handle cases where lines field is not useful
+        # Fallback to start/end line numbers if lines not available
+        start_line = result.get('start', {}).get('line', '')
+        end_line = result.get('end', {}).get('line', '')
+        if start_line and end_line:
+            if start_line == end_line:
+                lines = f"Line {start_line}"
+            else:
+                lines = f"Lines {start_line}-{end_line}"
+        else:
+            lines = "Line information not available"
+
+    # Clean up the lines content
+    if lines and lines != "requires login":
+        # Remove any non-code content
+        lines = lines.strip()
+
+    return lines
+
+# Extract category, description, reference and affected lines from one JSON result
+def parse_result(result):
+    # Extract category (check_id)
+    cat = result.get('check_id', 'Unknown')
+
+    # Build comprehensive description (path + message + metadata)
+    desc = " - ".join([result.get('path', ''), result_detail(result)]).strip()
+
+    return cat, desc, result_reference(result), result_code(result)
+
+# Map the semgrep severity of a JSON result to the report severity level
+def result_severity(result):
+    severity = result.get('extra', {}).get('severity', 'ERROR').upper()
+
+    if severity == 'ERROR':
+        return "high"
+    elif severity == 'WARNING':
+        return "medium"
+    else:  # INFO or other
+        return "low"
+
 # Parse semgrep JSON output and separate findings according to severity level
 def categorize_finding(scan_data):
     category = []  
@@ -839,64 +1703,10 @@ def categorize_finding(scan_data):
     if isinstance(scan_data, dict) and 'results' in scan_data:
         # Parse JSON output
         for result in scan_data['results']:
-            # Extract category (check_id)
-            cat = result.get('check_id', 'Unknown')
+            cat, desc, ref, lines = parse_result(result)
             category.append(cat)
-            
-            # Extract description (message + path)
-            msg = result.get('extra', {}).get('message', '')
-            path = result.get('path', '')
-            
-            # Get additional context from metadata if available
-            metadata = result.get('extra', {}).get('metadata', {})
-            cwe = metadata.get('cwe', [])
-            impact = metadata.get('impact', '')
-            
-            # Build comprehensive description
-            desc_parts = [path, msg]
-            if cwe:
-                desc_parts.append(f"CWE: {', '.join(cwe)}")
-            if impact:
-                desc_parts.append(f"Impact: {impact}")
-            
-            desc = " - ".join(desc_parts).strip()
             description.append(desc)
-            
-            # Extract reference (source URL) - prioritize shortlink
-            metadata = result.get('extra', {}).get('metadata', {})
-            ref = metadata.get('shortlink', '')
-            if not ref:
-                # Try alternative locations for the reference URL
-                ref = result.get('extra', {}).get('source', '')
-                if not ref:
-                    ref = metadata.get('source', '')
-                    if not ref:
-                        # Try references array
-                        references = metadata.get('references', [])
-                        if references:
-                            ref = references[0]
-                        else:
-                            ref = "Reference not available"
             reference.append(ref)
-            
-            # Extract affected lines (actual code from the file)
-            lines = result.get('extra', {}).get('lines', '')
-            if not lines or lines == "requires login":  # Handle cases where lines field is not useful
-                # Fallback to start/end line numbers if lines not available
-                start_line = result.get('start', {}).get('line', '')
-                end_line = result.get('end', {}).get('line', '')
-                if start_line and end_line:
-                    if start_line == end_line:
-                        lines = f"Line {start_line}"
-                    else:
-                        lines = f"Lines {start_line}-{end_line}"
-                else:
-                    lines = "Line information not available"
-            
-            # Clean up the lines content
-            if lines and lines != "requires login":
-                # Remove any non-code content
-                lines = lines.strip()
             code_lines.append(lines)
     else:
         # Fallback to original text parsing for backward compatibility
@@ -936,16 +1746,13 @@ def store_finding(category_deciders, descriptions, references, codes, scan_data=
                 code = codes[i]
                 
                 # Get severity from JSON
-                severity = result.get('extra', {}).get('severity', 'ERROR').upper()
-                
-                if severity == 'ERROR':
-                    category = "high"
+                category = result_severity(result)
+
+                if category == "high":
                     findings_list = high_findings
-                elif severity == 'WARNING':
-                    category = "medium"
+                elif category == "medium":
                     findings_list = medium_findings
-                else:  # INFO or other
-                    category = "low"
+                else:
                     findings_list = low_findings
                 
                 # Clean up the data
@@ -986,9 +1793,40 @@ def store_finding(category_deciders, descriptions, references, codes, scan_data=
 
     return high_findings, medium_findings, low_findings
 
-# Write to PDF
-def generate_pdf_report(high, medium, low, filename, project_name):
-    pdf = PDF()
+# Write one severity section: colored header followed by a table per finding
+def write_severity_section(pdf, findings, level, header_color, text_color):
+    if not findings:
+        return
+
+    first_layout = write_severity_header(pdf, findings[0], level, header_color, text_color)
+    pdf.write_to_table(findings, level, first_layout)
+
+# Colored severity header, kept on one page with the first finding; returns that finding's layout
+def write_severity_header(pdf, first_finding, level, header_color, text_color):
+    # Check if there's enough space for the header AND first finding; the
+    # first finding's layout is returned so it isn't redone
+    header_height = 15  # Header height
+    first_layout = pdf.layout_finding(first_finding, level)
+    total_needed_height = header_height + first_layout.height
+
+    if pdf.check_page_break(total_needed_height):
+        pdf.add_page()
+
+    # Severity header with colored accent
+    pdf.set_fill_color(*header_color)
+    pdf.rect(20, pdf.get_y(), pdf.get_available_width(), 12, 'F')
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.set_text_color(*text_color)
+    pdf.set_xy(25, pdf.get_y() + 2)
+    pdf.multi_cell(pdf.get_available_width(), 10, txt=f"[{level.upper()}] {level} Severity Findings")
+
+    pdf.set_font("Arial", size=10)
+    pdf.set_text_color(80, 80, 80)
+    return first_layout
+
+# Title, executive summary and scan summary on the first page
+def write_report_summary(pdf, high, medium, low, project_name, total_results=None, omitted=None, sidecar_path=None,
+                         diff=None, scan_config=None):
     pdf.add_page()
 
     # Add main title with better styling
@@ -1009,8 +1847,12 @@ def generate_pdf_report(high, medium, low, filename, project_name):
     pdf.multi_cell(pdf.get_available_width(), 10, txt="Executive Summary")
     pdf.ln(3)
     
-    # Summary statistics
-    total_findings = len(high) + len(medium) + len(low)
+    # Summary statistics, including findings left out of the PDF by --max-per-severity
+    omitted = omitted or {}
+    high_count = count_findings(high) + omitted.get("High", 0)
+    medium_count = count_findings(medium) + omitted.get("Medium", 0)
+    low_count = count_findings(low) + omitted.get("Low", 0)
+    total_findings = high_count + medium_count + low_count
     pdf.set_font("Arial", size=10)
     pdf.set_text_color(80, 80, 80)
     
@@ -1018,16 +1860,49 @@ def generate_pdf_report(high, medium, low, filename, project_name):
     summary_data = [
         ("Project Name", project_name),
         ("Total Findings", str(total_findings)),
-        ("High Severity", str(len(high))),
-        ("Medium Severity", str(len(medium))),
-        ("Low Severity", str(len(low)))
+        ("High Severity", str(high_count)),
+        ("Medium Severity", str(medium_count)),
+        ("Low Severity", str(low_count))
     ]
     
+    if sum(omitted.values()):
+        summary_data.append(("Not Shown In PDF", str(sum(omitted.values()))))
+    
+    # Grouped reports show one table per rule, so list how many tables there are
+    if any(isinstance(item, FindingGroup) for item in high + medium + low):
+        summary_data.append(("Rule Groups", str(len(high) + len(medium) + len(low))))
+
+    # Baseline reports only show new findings; say what they were compared with
+    if diff is not None:
+        summary_data[1] = ("New Findings", str(total_findings))
+        summary_data.append(("Fixed Findings", str(len(diff['fixed']))))
+        summary_data.append(("Unchanged Findings", str(diff['unchanged'])))
+        summary_data.append(("Baseline", diff['baseline']))
+        if diff['since']:
+            summary_data.append(("Changed Since", diff['since']))
+
+    # Semgrep options the scan ran with, so runs with different limits aren't compared blindly
+    if scan_config is not None and scan_config.describe():
+        summary_data.append(("Semgrep Options", scan_config.describe()))
+    
     # Draw summary table
     pdf.set_fill_color(245, 245, 245)
+    label_width = pdf.get_available_width() * 0.4
+    value_width = pdf.get_available_width() * 0.6
     for label, value in summary_data:
-        pdf.cell(pdf.get_available_width() * 0.4, 8, label, 1, 0, 'L', True)
-        pdf.cell(pdf.get_available_width() * 0.6, 8, value, 1, 1, 'L', True)
+        # Values such as the semgrep options can be longer than a line; wrap them like the findings tables
+        lines = pdf.wrap_text(pdf.clean_text(value), value_width)
+        if len(lines) == 1:
+            pdf.cell(label_width, 8, label, 1, 0, 'L', True)
+            pdf.cell(value_width, 8, lines[0], 1, 1, 'L', True)
+            continue
+        height = len(lines) * 6
+        if pdf.check_page_break(height):
+            pdf.add_page()
+        x_pos, y_pos = pdf.get_x(), pdf.get_y()
+        pdf.cell(label_width, height, label, 1, 0, 'L', True)
+        pdf.create_exact_height_cell(value_width, height, lines, border=1, fill=True)
+        pdf.set_xy(x_pos, y_pos + height)
     
     pdf.ln(5)
     
@@ -1040,8 +1915,7 @@ def generate_pdf_report(high, medium, low, filename, project_name):
     pdf.set_font("Arial", size=10)
     pdf.set_text_color(80, 80, 80)
     # Add scan summary information
-    if isinstance(findings, dict) and 'results' in findings:
-        total_results = len(findings['results'])
+    if total_results is not None:
         pdf.multi_cell(pdf.get_available_width(), 10, f"Scan completed with {total_results} findings detected.")
     else:
         pdf.multi_cell(pdf.get_available_width(), 10, "Scan completed. Results processed.")
@@ -1051,118 +1925,105 @@ def generate_pdf_report(high, medium, low, filename, project_name):
     pdf.set_font("Arial", style="I", size=9)
     pdf.set_text_color(120, 120, 120)
     pdf.multi_cell(pdf.get_available_width(), 8, txt="Note: Very long descriptions are automatically summarized for better readability. Full details are available in the original scan output.")
+    if sidecar_path:
+        pdf.multi_cell(pdf.get_available_width(), 8, txt=pdf.clean_text(
+            f"Note: The number of findings rendered per severity is capped. The {sum(omitted.values())} findings "
+            f"not shown are listed in {os.path.basename(sidecar_path)} next to this report."))
     pdf.ln(5)
 
-    # High severity findings
-    if high:
-        # Check if there's enough space for the header AND first finding
-        # Calculate space needed for header + first finding
-        header_height = 15  # Header height
-        first_finding_height = 0
-        
-        # Calculate height needed for first finding
-        if high:
-            first_finding = high[0]
-            available_width = pdf.get_available_width()
-            data_width = available_width - int(available_width * 0.2)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.category), data_width, 6)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.description), data_width, 6)
-            first_finding_height += 6  # Severity level row
-            first_finding_height += pdf.calculate_text_height(str(first_finding.reference), data_width, 6)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.code), data_width, 6)
-            first_finding_height += 15  # Spacing
-        
-        total_needed_height = header_height + first_finding_height
-        
-        if pdf.check_page_break(total_needed_height):
-            pdf.add_page()
-        
-        # High severity header with red accent
-        pdf.set_fill_color(255, 200, 200)
-        pdf.rect(20, pdf.get_y(), pdf.get_available_width(), 12, 'F')
-        pdf.set_font("Arial", style="B", size=12)
-        pdf.set_text_color(150, 0, 0)
-        pdf.set_xy(25, pdf.get_y() + 2)
-        pdf.multi_cell(pdf.get_available_width(), 10, txt="[HIGH] High Severity Findings")
-        
-        pdf.set_font("Arial", size=10)
-        pdf.set_text_color(80, 80, 80)
-        pdf.write_to_table(high,"High")
-        pdf.ln(3)
+# List of baseline findings that are no longer reported
+def write_fixed_section(pdf, fixed):
+    if not fixed:
+        return
 
-    # Medium severity findings
-    if medium:
-        # Check if there's enough space for the header AND first finding
-        # Calculate space needed for header + first finding
-        header_height = 15  # Header height
-        first_finding_height = 0
-        
-        # Calculate height needed for first finding
-        if medium:
-            first_finding = medium[0]
-            available_width = pdf.get_available_width()
-            data_width = available_width - int(available_width * 0.2)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.category), data_width, 6)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.description), data_width, 6)
-            first_finding_height += 6  # Severity level row
-            first_finding_height += pdf.calculate_text_height(str(first_finding.reference), data_width, 6)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.code), data_width, 6)
-            first_finding_height += 15  # Spacing
-        
-        total_needed_height = header_height + first_finding_height
-        
-        if pdf.check_page_break(total_needed_height):
-            pdf.add_page()
-        
-        # Medium severity header with orange accent
-        pdf.set_fill_color(255, 240, 200)
-        pdf.rect(20, pdf.get_y(), pdf.get_available_width(), 12, 'F')
-        pdf.set_font("Arial", style="B", size=12)
-        pdf.set_text_color(150, 100, 0)
-        pdf.set_xy(25, pdf.get_y() + 2)
-        pdf.multi_cell(pdf.get_available_width(), 10, txt="[MEDIUM] Medium Severity Findings")
-        
-        pdf.set_font("Arial", size=10)
-        pdf.set_text_color(80, 80, 80)
-        pdf.write_to_table(medium,"Medium")
-        pdf.ln(3)
+    if pdf.check_header_space(30):
+        pdf.add_page()
+    pdf.set_fill_color(220, 235, 255)
+    pdf.rect(20, pdf.get_y(), pdf.get_available_width(), 12, 'F')
+    pdf.set_font("Arial", style="B", size=12)
+    pdf.set_text_color(0, 60, 130)
+    pdf.set_xy(25, pdf.get_y() + 2)
+    pdf.multi_cell(pdf.get_available_width(), 10, txt=f"[FIXED] {len(fixed)} Findings No Longer Reported")
+    pdf.ln(2)
 
-    # Low severity findings
-    if low:
-        # Check if there's enough space for the header AND first finding
-        # Calculate space needed for header + first finding
-        header_height = 15  # Header height
-        first_finding_height = 0
-        
-        # Calculate height needed for first finding
-        if low:
-            first_finding = low[0]
-            available_width = pdf.get_available_width()
-            data_width = available_width - int(available_width * 0.2)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.category), data_width, 6)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.description), data_width, 6)
-            first_finding_height += 6  # Severity level row
-            first_finding_height += pdf.calculate_text_height(str(first_finding.reference), data_width, 6)
-            first_finding_height += pdf.calculate_text_height(str(first_finding.code), data_width, 6)
-            first_finding_height += 15  # Spacing
-        
-        total_needed_height = header_height + first_finding_height
-        
-        if pdf.check_page_break(total_needed_height):
-            pdf.add_page()
-        
-        # Low severity header with green accent
-        pdf.set_fill_color(200, 255, 200)
-        pdf.rect(20, pdf.get_y(), pdf.get_available_width(), 12, 'F')
-        pdf.set_font("Arial", style="B", size=12)
-        pdf.set_text_color(0, 100, 0)
-        pdf.set_xy(25, pdf.get_y() + 2)
-        pdf.multi_cell(pdf.get_available_width(), 10, txt="[LOW] Low Severity Findings")
-        
-        pdf.set_font("Arial", size=10)
+    pdf.set_font("Arial", size=9)
+    pdf.set_text_color(80, 80, 80)
+    for result in fixed:
+        location = f"{result.get('path', '')}:{result.get('start', {}).get('line', '')}"
+        severity = result_severity(result).capitalize()
+        pdf.multi_cell(pdf.get_available_width(), 6,
+                       txt=pdf.clean_text(f"[{severity}] {result.get('check_id', 'Unknown')} - {location}"))
+    pdf.ln(5)
+
+# Findings per severity over the last runs, as a stacked bar chart and a table
+def write_trend_section(pdf, runs, top_rules=5):
+    if len(runs) < 2:
+        return
+
+    if pdf.check_header_space(60 + 8 * len(runs)):
+        pdf.add_page()
+    pdf.set_font("Arial", style="B", size=14)
+    pdf.set_text_color(50, 50, 50)
+    pdf.multi_cell(pdf.get_available_width(), 10, txt=f"Trend - Last {len(runs)} Runs")
+    pdf.ln(2)
+
+    # Stacked bars, High at the bottom
+    width = pdf.get_available_width()
+    chart_height = 40
+    bottom = pdf.get_y() + chart_height
+    highest = max(run['high'] + run['medium'] + run['low'] for run in runs) or 1
+    slot = width / len(runs)
+    for i, run in enumerate(runs):
+        y = bottom
+        for level, _, color, _ in SEVERITY_SECTIONS:
+            height = run[level.lower()] / highest * chart_height
+            if height > 0:
+                pdf.set_fill_color(*color)
+                pdf.rect(20 + i * slot + slot * 0.2, y - height, slot * 0.6, height, 'F')
+                y -= height
+    pdf.set_draw_color(150, 150, 150)
+    pdf.line(20, bottom, 20 + width, bottom)
+    pdf.set_draw_color(0, 0, 0)
+    pdf.set_y(bottom + 3)
+
+    columns = (("Run", 0.3), ("High", 0.14), ("Medium", 0.14), ("Low", 0.14), ("Total", 0.14), ("Change", 0.14))
+    pdf.set_font("Arial", style="B", size=9)
+    pdf.set_text_color(50, 50, 50)
+    pdf.set_fill_color(230, 230, 230)
+    for label, share in columns:
+        pdf.cell(width * share, 7, label, 1, 0, 'C', True)
+    pdf.ln()
+
+    pdf.set_font("Arial", size=9)
+    pdf.set_text_color(80, 80, 80)
+    previous = None
+    for run in runs:
+        total = run['high'] + run['medium'] + run['low']
+        change = "" if previous is None else f"{total - previous:+d}"
+        values = (run['time'], run['high'], run['medium'], run['low'], total, change)
+        for (_, share), value in zip(columns, values):
+            pdf.cell(width * share, 7, str(value), 1, 0, 'C')
+        pdf.ln()
+        previous = total
+    pdf.ln(3)
+
+    # Rules whose counts moved the most since the previous run
+    before, after = runs[-2]['rules'], runs[-1]['rules']
+    changes = sorted(((after.get(rule, 0) - before.get(rule, 0), rule) for rule in set(before) | set(after)),
+                     key=lambda change: abs(change[0]), reverse=True)
+    changes = [change for change in changes[:top_rules] if change[0]]
+    if changes:
+        pdf.set_font("Arial", style="B", size=10)
+        pdf.set_text_color(50, 50, 50)
+        pdf.multi_cell(width, 8, txt="Largest Changes Since the Previous Run")
+        pdf.set_font("Arial", size=9)
         pdf.set_text_color(80, 80, 80)
-        pdf.write_to_table(low,"Low")
+        for delta, rule in changes:
+            pdf.multi_cell(width, 6, txt=pdf.clean_text(f"{delta:+d}  {rule}"))
+    pdf.ln(5)
 
+# Conclusion and recommendations on their own page
+def write_conclusion(pdf, high, medium, project_name):
     # Add conclusion section
     if pdf.check_header_space(40):  # Conclusion needs more space
         pdf.add_page()
@@ -1211,25 +2072,972 @@ def generate_pdf_report(high, medium, low, filename, project_name):
     pdf.multi_cell(pdf.get_available_width(), 8, txt="- Maintain security awareness and training programs")
     pdf.ln(5)
 
-    # Save the PDF to a file
-    pdf.output(filename)
+# Write the severity sections one after another
+def write_sections(pdf, findings_by_level):
+    for level, header_color, text_color, spacing in SEVERITY_SECTIONS:
+        with profile_stage(f"report.section.{level.lower()}", findings=len(findings_by_level[level])) as stage:
+            write_severity_section(pdf, findings_by_level[level], level, header_color, text_color)
+            if findings_by_level[level] and spacing:
+                pdf.ln(spacing)
+            stage['last_page'] = pdf.page_no()
 
-if __name__ == "__main__":
-    path, filename = check_sysarg()
-    
-    # Extract project name from path
+# Render one partition of a severity section; runs in a render worker process
+def render_shard(level, findings, with_header, line_breaking="greedy", compact=False):
+    """Return the content of every page and the height reached on the last one"""
+    from report_pdf import ShardPDF
+
+    pdf = ShardPDF()
+    # Passed in rather than read from the class, which a spawned worker has at its defaults
+    pdf.line_breaking = line_breaking
+    pdf.compact = compact
+    pdf.add_page()
+    colors = {section[0]: section[1:3] for section in SEVERITY_SECTIONS}
+    if with_header:
+        write_severity_section(pdf, findings, level, *colors[level])
+    else:
+        pdf.set_font("Arial", size=10)
+        pdf.set_text_color(80, 80, 80)
+        pdf.write_to_table(findings, level)
+    return pdf.finished_pages()
+
+# Split the severity sections into chunks that are rendered by separate processes
+def partition_findings(findings_by_level, chunk_size):
+    """Return (level, chunk, with_header) in report order; only each section's first chunk has the header"""
+    shards = []
+    for level, _, _, _ in SEVERITY_SECTIONS:
+        findings = findings_by_level[level]
+        for start in range(0, len(findings), chunk_size):
+            shards.append((level, findings[start:start + chunk_size], start == 0))
+    return shards
+
+# Render the severity sections in worker processes and stitch their pages into the report
+def write_sections_sharded(pdf, findings_by_level, workers, chunk_size):
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = partition_findings(findings_by_level, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_shard, *shard, pdf.line_breaking, pdf.compact) for shard in shards]
+        # Shards are merged in report order; later ones keep rendering meanwhile
+        for (level, chunk, _), future in zip(shards, futures):
+            pages, y = future.result()
+            pdf.append_pages(pages, y)
+            if pdf.progress is not None:
+                pdf.progress(len(chunk))
+
+class SectionRenderer:
+    """Draws one severity section finding by finding, on pages of its own.
+
+    Used by the pipelined mode to render findings while the scan is still
+    running. Each finding is drawn when the next one of its severity arrives,
+    since the spacing after a finding depends on whether it is the last.
+    """
+
+    def __init__(self, level):
+        self.level = level
+        self.colors = {section[0]: section[1:3] for section in SEVERITY_SECTIONS}[level]
+        self.findings = []
+        self.pdf = None
+
+    def add(self, finding):
+        if self.findings:
+            self._draw(self.findings[-1], last=False)
+        self.findings.append(finding)
+
+    def _draw(self, finding, last):
+        layout = None
+        if self.pdf is None:
+            from report_pdf import ShardPDF
+
+            self.pdf = ShardPDF()
+            self.pdf.add_page()
+            layout = write_severity_header(self.pdf, finding, self.level, *self.colors)
+        self.pdf.write_finding(finding, self.level, layout, last)
+
+    def close(self):
+        """Return the section's pages for PDF.append_pages(), or None when it has no findings"""
+        if not self.findings:
+            return None
+        self._draw(self.findings[-1], last=True)
+        return self.pdf.finished_pages()
+
+# Pipeline stage 1: run semgrep and queue each result as soon as its JSON is complete
+async def read_semgrep_results(path, results, progress=None, config=None):
+    import asyncio
+    import codecs
+
+    loop = asyncio.get_running_loop()
+    parser = SemgrepResultParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        process, stderr_reader = start_semgrep(path, config, progress=progress)
+
+        # Pipe reads block, so they run in the default executor while the loop keeps rendering
+        def read():
+            return loop.run_in_executor(None, process.stdout.read1, 65536)
+
+        try:
+            while True:
+                chunk = await read()
+                if not chunk:
+                    break
+                for result in parser.feed(decoder.decode(chunk)):
+                    await results.put(result)
+            for result in parser.feed(decoder.decode(b"", final=True)):
+                await results.put(result)
+            for result in parser.close():
+                await results.put(result)
+        except ValueError as e:
+            print(f"Warning: Could not parse semgrep JSON output: {e}")
+            # Keep draining so semgrep isn't left blocked on a full pipe
+            while await read():
+                pass
+    finally:
+        await results.put(None)
+
+    await loop.run_in_executor(None, finish_semgrep, process, stderr_reader,
+                               f"Done ({parser.result_count} results)")
+
+# Pipeline stage 2: turn results into findings tagged with their severity section
+async def parse_findings(results, findings):
+    while True:
+        result = await results.get()
+        if result is None:
+            await findings.put(None)
+            return
+        await findings.put((result_severity(result), make_finding(result)))
+
+# Pipeline stage 3: draw every finding into its severity section as it arrives
+async def render_findings(findings, renderers, yield_every=16):
+    import asyncio
+
+    drawn = 0
+    while True:
+        item = await findings.get()
+        if item is None:
+            return
+        severity, finding = item
+        renderers[severity].add(finding)
+        # Drawing never waits on I/O, so hand the loop back regularly to keep semgrep's pipe drained
+        drawn += 1
+        if drawn % yield_every == 0:
+            await asyncio.sleep(0)
+
+# Scan, parse and render concurrently, connected by bounded queues so a slow
+# renderer holds back the parser and semgrep instead of buffering everything
+async def pipeline_scan(path, show_progress=True, queue_size=256, config=None):
+    """Return (high, medium, low, rendered); rendered holds each section's pages for generate_pdf_report()"""
+    import asyncio
+
+    results = asyncio.Queue(queue_size)
+    findings = asyncio.Queue(queue_size)
+    renderers = {level.lower(): SectionRenderer(level) for level, _, _, _ in SEVERITY_SECTIONS}
+
+    progress = scan_progress() if show_progress else None
+    try:
+        await asyncio.gather(
+            read_semgrep_results(path, results, progress, config),
+            parse_findings(results, findings),
+            render_findings(findings, renderers),
+        )
+    finally:
+        if progress is not None:
+            progress.stop()
+
+    rendered = {level: renderers[level.lower()].close() for level, _, _, _ in SEVERITY_SECTIONS}
+    return renderers["high"].findings, renderers["medium"].findings, renderers["low"].findings, rendered
+
+# Write to PDF
+def generate_pdf_report(high, medium, low, filename, project_name, total_results=None, omitted=None, sidecar_path=None,
+                        progress=None, render_workers=None, render_chunk=2000, rendered=None, diff=None,
+                        trend=None, scan_config=None):
+    from report_pdf import PDF
+
+    pdf = PDF(progress)
+    # Pages go to a .part file as they are finished, so memory stays flat however long the report gets.
+    # It replaces the report only once the document is complete; a failed render leaves no broken PDF.
+    partial = filename + ".part"
+    pdf.stream_to(partial)
+    complete = False
+    try:
+        with profile_stage("report.summary"):
+            write_report_summary(pdf, high, medium, low, project_name, total_results, omitted, sidecar_path, diff,
+                                 scan_config)
+        if trend:
+            with profile_stage("report.trend", runs=len(trend)):
+                write_trend_section(pdf, trend)
+
+        # Severity sections, each starting with its header. With several render workers
+        # every chunk of `render_chunk` findings is rendered on its own pages in parallel.
+        findings_by_level = {"High": high, "Medium": medium, "Low": low}
+        if rendered is not None:
+            # Sections already drawn while scanning (see pipeline_scan)
+            with profile_stage("report.sections", prerendered=True) as stage:
+                for level, _, _, _ in SEVERITY_SECTIONS:
+                    if rendered[level] is not None:
+                        pdf.append_pages(*rendered[level])
+                stage['last_page'] = pdf.page_no()
+            if progress is not None:
+                progress(len(high) + len(medium) + len(low))
+        elif render_workers and render_workers > 1 and high + medium + low:
+            with profile_stage("report.sections", workers=render_workers, chunk=render_chunk) as stage:
+                write_sections_sharded(pdf, findings_by_level, render_workers, render_chunk)
+                stage['last_page'] = pdf.page_no()
+        else:
+            write_sections(pdf, findings_by_level)
+
+        if diff is not None:
+            with profile_stage("report.fixed", findings=len(diff['fixed'])):
+                write_fixed_section(pdf, diff['fixed'])
+
+        with profile_stage("report.conclusion"):
+            write_conclusion(pdf, high, medium, project_name)
+
+        # Write the page tree, fonts and cross-reference table after the streamed pages
+        if progress is not None:
+            progress(0, "Writing PDF")
+        with profile_stage("report.output") as stage:
+            pdf.output()
+            stage['pages'] = pdf.page_no()
+        complete = True
+    finally:
+        pdf.close_stream()
+        if not complete:
+            os.remove(partial)
+    os.replace(partial, filename)
+
+# Write every finding as one JSON record per line (see finding_to_record)
+def write_jsonl_report(high, medium, low, filename, project_name, total_results=None):
+    with open(filename, 'w', encoding='utf-8') as f:
+        for level, findings in (("High", high), ("Medium", medium), ("Low", low)):
+            for finding in findings:
+                f.write(json.dumps(finding_to_record(finding, level)) + "\n")
+
+# Head of the HTML report: styles, the paging script and the empty table the findings are drawn into
+HTML_REPORT_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>SAST Report - $project</title>
+<style>
+body { font-family: Arial, Helvetica, sans-serif; color: #323232; margin: 0; }
+header { background: #f0f0f0; padding: 16px 24px; }
+header h1 { font-size: 20px; margin: 0 0 4px; }
+header p { font-size: 12px; color: #646464; margin: 0; }
+main { padding: 16px 24px; }
+.counts span { display: inline-block; margin-right: 16px; font-weight: bold; }
+.controls { margin: 16px 0; font-size: 13px; }
+.controls input, .controls select, .controls button { font-size: 13px; margin-right: 8px; }
+table { border-collapse: collapse; width: 100%; font-size: 12px; table-layout: fixed; }
+th, td { border: 1px solid #dcdcdc; padding: 4px 6px; text-align: left; vertical-align: top; overflow-wrap: anywhere; }
+th { background: #f0f0f0; }
+th:nth-child(1) { width: 70px; } th:nth-child(2) { width: 22%; } th:nth-child(3) { width: 18%; }
+pre { margin: 0; white-space: pre-wrap; font-size: 11px; }
+.High { color: #fff; background: #dc3545; } .Medium { color: #fff; background: #fd7e14; } .Low { color: #fff; background: #28a745; }
+</style>
+<script>
+var findings = [];
+var shown = findings;
+var page = 0;
+
+function addFindings(records) {
+  for (var i = 0; i < records.length; i++) findings.push(records[i]);
+  // Draw while the rest of the file is still loading, as long as the current page isn't full
+  if (shown === findings && findings.length - records.length < (page + 1) * pageSize()) render();
+  else updateStatus();
+}
+
+function pageSize() { return parseInt(document.getElementById("page-size").value, 10); }
+
+function applyFilter() {
+  var severity = document.getElementById("severity").value;
+  var query = document.getElementById("search").value.toLowerCase();
+  if (!severity && !query) {
+    shown = findings;
+  } else {
+    shown = findings.filter(function (f) {
+      if (severity && f.severity !== severity) return false;
+      if (!query) return true;
+      return [f.rule, f.path, f.description, f.code, (f.occurrences || []).join(" ")].join("\\n").toLowerCase().indexOf(query) !== -1;
+    });
+  }
+  page = 0;
+  render();
+}
+
+function cell(row, text, className) {
+  var td = row.insertCell();
+  if (className) td.className = className;
+  td.textContent = text;
+  return td;
+}
+
+function render() {
+  var body = document.getElementById("findings");
+  var size = pageSize();
+  var pages = Math.max(1, Math.ceil(shown.length / size));
+  page = Math.min(Math.max(page, 0), pages - 1);
+  body.textContent = "";
+  for (var i = page * size; i < Math.min(shown.length, (page + 1) * size); i++) {
+    var f = shown[i];
+    var row = body.insertRow();
+    cell(row, f.severity, f.severity);
+    cell(row, f.rule);
+    cell(row, f.occurrences ? f.occurrences.length + " occurrences" : f.path + ":" + f.line);
+    var details = cell(row, f.description);
+    var code = document.createElement("pre");
+    code.textContent = f.occurrences ? f.occurrences.join("\\n") : f.code;
+    details.appendChild(code);
+    if (/^https?:\\/\\//.test(f.reference)) {
+      var link = document.createElement("a");
+      link.href = f.reference;
+      link.textContent = f.reference;
+      details.appendChild(link);
+    } else if (f.reference) {
+      details.appendChild(document.createTextNode(f.reference));
+    }
+  }
+  updateStatus();
+}
+
+function updateStatus() {
+  var size = pageSize();
+  var pages = Math.max(1, Math.ceil(shown.length / size));
+  var first = shown.length ? page * size + 1 : 0;
+  document.getElementById("status").textContent = "Showing " + first + "-" + Math.min(shown.length, (page + 1) * size) +
+    " of " + shown.length + " findings (page " + (page + 1) + " of " + pages + ")";
+}
+
+function go(delta) { page += delta; render(); }
+</script>
+</head>
+<body>
+<header>
+<h1>Static Application Security Testing Report - $project</h1>
+<p>Generated by Semgrep CLI on $generated</p>
+</header>
+<main>
+<div class="counts">
+<span>Total: $total</span><span>High: $high</span><span>Medium: $medium</span><span>Low: $low</span>
+</div>
+<div class="controls">
+<select id="severity" onchange="applyFilter()">
+<option value="">All severities</option><option>High</option><option>Medium</option><option>Low</option>
+</select>
+<input id="search" type="search" placeholder="Filter by rule, path or text" onchange="applyFilter()">
+<select id="page-size" onchange="render()">
+<option>50</option><option selected>100</option><option>500</option>
+</select>
+<button onclick="go(-1)">Previous</button><button onclick="go(1)">Next</button>
+<span id="status"></span>
+</div>
+<table>
+<thead><tr><th>Severity</th><th>Rule</th><th>Location</th><th>Details</th></tr></thead>
+<tbody id="findings"></tbody>
+</table>
+</main>
+"""
+
+# Write a single-file HTML report; findings are embedded in chunks and paged in the browser
+def write_html_report(high, medium, low, filename, project_name, total_results=None, chunk_size=1000):
+    """The findings are written a chunk at a time, so neither this function nor the browser
+    holds the page as one string, and the first page is shown before the file has loaded.
+    """
+    import html
+    from datetime import datetime
+    from string import Template
+
+    def write_chunk(records):
+        # '<' is escaped so no finding can close the script element
+        data = json.dumps(records).replace('<', '\\u003c')
+        f.write(f"<script>addFindings({data});</script>\n")
+
+    counts = {"high": count_findings(high), "medium": count_findings(medium), "low": count_findings(low)}
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(Template(HTML_REPORT_HEAD).substitute(
+            project=html.escape(project_name),
+            generated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            total=total_results if total_results is not None else sum(counts.values()),
+            **counts))
+        chunk = []
+        for level, findings in (("High", high), ("Medium", medium), ("Low", low)):
+            for finding in findings:
+                chunk.append(finding_to_record(finding, level))
+                if len(chunk) == chunk_size:
+                    write_chunk(chunk)
+                    chunk = []
+        write_chunk(chunk)
+        f.write("<script>render();</script>\n</body>\n</html>\n")
+
+# Reports written from the same findings as the PDF: format -> (file extension, writer)
+REPORT_WRITERS = {
+    "html": (".html", write_html_report),
+    "jsonl": (".jsonl", write_jsonl_report),
+}
+
+# Files written for a report in the given formats: the PDF is `filename`, other formats change its extension
+def report_outputs(filename, formats):
+    return [filename if name == "pdf" else os.path.splitext(filename)[0] + REPORT_WRITERS[name][0] for name in formats]
+
+# Write the HTML and JSONL reports in threads while the body of the with block renders the PDF
+@contextmanager
+def report_writers(formats, high, medium, low, filename, project_name, total_results=None, show_progress=True):
+    """Each report is written next to `filename` with its own extension.
+
+    The writers only read the findings lists, so the PDF can be rendered from
+    the same lists at the same time; the lists are parsed once for every format.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    writers = [name for name in formats if name in REPORT_WRITERS]
+    if not writers:
+        yield
+        return
+
+    with ThreadPoolExecutor(max_workers=len(writers)) as executor:
+        futures = {}
+        for name, output in zip(writers, report_outputs(filename, writers)):
+            futures[output] = executor.submit(REPORT_WRITERS[name][1], high, medium, low, output, project_name,
+                                              total_results)
+        yield
+        for output, future in futures.items():
+            future.result()
+            if show_progress:
+                print(f"Report written to {output}")
+
+# Collect the findings of a project according to the input options (saved files, cache, stream or plain scan)
+def gather_findings(path, project_name, options, show_progress=True, group_by=None):
+    """Return (high, medium, low, total_results) for one report"""
+
+    if options.input and options.stream:
+        with profile_stage("load+build_findings", streamed=True):
+            high, medium, low = collect_findings(iter_scan_files(options.input), group_by)
+        total_results = count_findings(high) + count_findings(medium) + count_findings(low)
+    elif options.input:
+        with profile_stage("load"):
+            findings = load_scan_files(options.input)
+        with profile_stage("build_findings", results=len(findings['results'])):
+            high, medium, low = build_findings(findings, group_by)
+        total_results = len(findings['results'])
+    elif options.scan_shards:
+        with profile_stage("scan", shards=options.scan_shards):
+            findings = scan_sharded(path, options.scan_shards, options.scan_jobs, show_progress, options.scan)
+        with profile_stage("build_findings", results=len(findings['results'])):
+            high, medium, low = build_findings(findings, group_by)
+        total_results = len(findings['results'])
+    elif options.cache:
+        with profile_stage("scan", cached=True):
+            findings = scan_cached(path, project_name, show_progress, options.scan)
+        with profile_stage("build_findings", results=len(findings['results'])):
+            high, medium, low = build_findings(findings, group_by)
+        total_results = len(findings['results'])
+    elif options.stream:
+        # Findings are built while semgrep output is read; the raw JSON is never held in full
+        with profile_stage("scan+build_findings", streamed=True):
+            high, medium, low = collect_findings(scan_stream(path, show_progress, options.scan), group_by)
+        total_results = count_findings(high) + count_findings(medium) + count_findings(low)
+    else:
+        with profile_stage("scan"):
+            findings = scan(path, show_progress, options.scan)
+        with profile_stage("build_findings"):
+            high, medium, low = build_findings(findings, group_by)
+        total_results = len(findings['results']) if isinstance(findings, dict) else None
+
+    return high, medium, low, total_results
+
+# Gather the findings of one project, apply the per-severity caps and write its PDF report
+def build_report(path, project_name, filename, options, show_progress=True):
+    """Return the number of findings; with --profile the stage trace is written next to the report"""
+    finding_count = None
+    if options.profile:
+        start_profiling()
+    if "pdf" in options.format:
+        from report_pdf import PDF
+
+        PDF.line_breaking = options.line_breaking
+        PDF.compact = options.compact
+
+    try:
+        with profile_stage("total"):
+            rendered, diff = None, None
+            # Runs are recorded finding by finding, so grouping waits until they are stored
+            group_by = None if options.db else options.group_by
+            if options.from_db:
+                # Opening a missing database would create an empty one
+                if not os.path.exists(options.db):
+                    raise RuntimeError(f"Findings database {options.db} does not exist")
+                db = FindingsDB(options.db)
+                try:
+                    if options.run is None:
+                        run_id = db.latest_run(project_name)
+                        if run_id is None:
+                            raise RuntimeError(f"No recorded runs of '{project_name}' in the findings database")
+                    else:
+                        run_id = options.run
+                        recorded_project = db.project_of_run(run_id)
+                        if recorded_project is None:
+                            raise RuntimeError(f"No run {run_id} in the findings database")
+                        if recorded_project != project_name:
+                            raise RuntimeError(f"Run {run_id} belongs to project '{recorded_project}', not '{project_name}'")
+                    with profile_stage("load", run=run_id):
+                        high, medium, low = db.load_run(run_id)
+                finally:
+                    db.close()
+                total_results = len(high) + len(medium) + len(low)
+            elif options.baseline:
+                with profile_stage("scan", baseline=True, since=options.since):
+                    diff = scan_baseline(path, project_name, options.baseline, options.since, show_progress,
+                                         options.scan)
+                with profile_stage("build_findings", results=len(diff['new'])):
+                    high, medium, low = build_findings({'results': diff['new']}, group_by)
+                total_results = len(diff['new'])
+                print(f"{len(diff['new'])} new, {len(diff['fixed'])} fixed, {diff['unchanged']} unchanged findings")
+            elif options.pipeline:
+                import asyncio
+
+                # Sections are rendered while semgrep output is read; only the merge is left for the report
+                with profile_stage("scan+render", pipelined=True):
+                    high, medium, low, rendered = asyncio.run(pipeline_scan(path, show_progress, config=options.scan))
+                total_results = len(high) + len(medium) + len(low)
+            else:
+                high, medium, low, total_results = gather_findings(path, project_name, options, show_progress, group_by)
+
+            if options.db and not options.from_db:
+                with profile_stage("record"):
+                    db = FindingsDB(options.db)
+                    try:
+                        db.record_run(project_name, high, medium, low, report_outputs(filename, options.format)[0],
+                                      "baseline" if diff else "full")
+                    finally:
+                        db.close()
+            if options.group_by and group_by is None:
+                high, medium, low = group_findings(high, medium, low, options.group_by)
+            finding_count = count_findings(high) + count_findings(medium) + count_findings(low)
+
+            # Only complete scans go into the trend; baseline reports count new findings only
+            summary, trend = None, None
+            if not options.from_db and diff is None:
+                summary = summarize_run(project_name, report_outputs(filename, options.format), high, medium, low)
+            if options.trend:
+                with profile_stage("trend"):
+                    trend = load_recent_runs(filename, project_name, options.trend - (summary is not None))
+                trend += [summary] if summary else []
+
+            # The HTML and JSONL reports list every finding; caps only apply to the PDF
+            with profile_stage("reports", formats=",".join(options.format)), \
+                    report_writers(options.format, high, medium, low, filename, project_name, total_results,
+                                   show_progress):
+                if "pdf" in options.format:
+                    omitted, sidecar_path = None, None
+                    if options.max_per_severity:
+                        with profile_stage("limit_findings"):
+                            high, medium, low, omitted, sidecar_path = limit_findings(
+                                high, medium, low, options.max_per_severity, filename, options.sample)
+
+                    finding_total = count_findings(high) + count_findings(medium) + count_findings(low)
+                    with profile_stage("report", findings=finding_total):
+                        rendered_count = len(high) + len(medium) + len(low)
+                        with render_progress(rendered_count) if show_progress else nullcontext() as progress:
+                            generate_pdf_report(high, medium, low, filename, project_name, total_results, omitted,
+                                                sidecar_path, progress, options.render_workers, options.render_chunk,
+                                                rendered, diff, trend,
+                                                None if options.input or options.from_db else options.scan)
+            if summary is not None:
+                append_run_summary(filename, summary)
+    finally:
+        if options.profile:
+            trace = stop_profiling(project=project_name, report=filename, findings=finding_count)
+            # A path given to --profile is used for single reports; batch reports each get their own trace
+            trace_path = options.profile if isinstance(options.profile, str) and not options.batch \
+                else os.path.splitext(filename)[0] + ".profile.json"
+            with open(trace_path, 'w') as f:
+                json.dump(trace, f, indent=2)
+            if show_progress:
+                print_profile(trace)
+                print(f"Profile trace written to {trace_path}")
+
+    return finding_count
+
+# Project name of a single report: --project, else the scanned directory or first input file
+def report_project_name(args):
+    if args.project:
+        return args.project
+    if args.path is not None:
+        return extract_project_name(args.path)
+    return os.path.splitext(os.path.basename(args.input[0]))[0]
+
+# Scan one project and write its report; runs inside a batch worker process
+def run_project(path, options):
+    import time
+
+    start = time.perf_counter()
     project_name = extract_project_name(path)
-    print(f"Scanning project: {project_name}")
-    
-    # Generate default output path if none provided
-    if filename is None:
+    summary = {'project': project_name, 'path': path, 'filename': None, 'findings': 0, 'error': None}
+
+    try:
         filename = generate_default_output_path(project_name)
-        print(f"Output will be saved to: {filename}")
-    
-    findings = scan(path)
-    category, description, reference, code = categorize_finding(findings)
-    high, medium, low = store_finding(category, description, reference, code, findings)
+        summary['findings'] = build_report(path, project_name, filename, options, show_progress=False)
+        summary['filename'] = ", ".join(report_outputs(filename, options.format))
+    except Exception as e:
+        summary['error'] = f"{type(e).__name__}: {e}"
 
-    generate_pdf_report(high, medium, low, filename, project_name)
-    
-    
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+# Expand batch arguments (directories or glob patterns) into unique project paths
+def expand_project_paths(patterns):
+    import glob
+
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.expanduser(pattern))) or [pattern]
+        for match in matches:
+            if not os.path.isdir(match):
+                print(f"Warning: {match} is not a directory, skipping")
+                continue
+            real_path = os.path.realpath(match)
+            if real_path not in seen:
+                seen.add(real_path)
+                paths.append(match)
+
+    # Reports are stored per project name, so two projects with the same name would overwrite each other
+    names = {}
+    for path in paths:
+        names.setdefault(extract_project_name(path), []).append(path)
+    for name, duplicates in names.items():
+        if len(duplicates) > 1:
+            print(f"Warning: {len(duplicates)} projects are named '{name}', their reports will share reports/{name}/")
+
+    return paths
+
+# Scan many projects concurrently with a bounded process pool, one report per project
+def run_batch(patterns, options, workers=None):
+    import time
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    paths = expand_project_paths(patterns)
+    if not paths:
+        print("No project directories matched.")
+        return []
+
+    workers = workers or min(4, os.cpu_count() or 1)
+    print(f"Scanning {len(paths)} projects with {workers} workers")
+
+    start = time.perf_counter()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_project, path, options) for path in paths]
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            status = summary['error'] or summary['filename']
+            print(f"[{len(summaries)}/{len(paths)}] {summary['project']} ({summary['seconds']:.1f}s): {status}")
+    elapsed = time.perf_counter() - start
+
+    # Summary of wall time per project, slowest first
+    print("")
+    print(f"{'Project':<40} {'Findings':>8} {'Time (s)':>9}  Report")
+    for summary in sorted(summaries, key=lambda item: item['seconds'], reverse=True):
+        report = summary['filename'] or f"FAILED: {summary['error']}"
+        print(f"{summary['project'][:40]:<40} {summary['findings']:>8} {summary['seconds']:>9.1f}  {report}")
+    failed = sum(1 for summary in summaries if summary['error'])
+    print(f"Total: {len(summaries)} projects in {elapsed:.1f}s ({failed} failed)")
+
+    return summaries
+
+# Import fpdf and set up the report fonts once per server worker instead of once per report
+def warm_report_worker():
+    from report_pdf import PDF
+
+    pdf = PDF()
+    pdf.add_page()
+    for style in PDF.REPORT_FONT_STYLES:
+        pdf.set_font('Arial', style, 10)
+        pdf.wrap_text("Static Application Security Testing Report", pdf.get_data_width())
+    semgrep_version()
+
+# Generate one report requested from a report server; runs in a server worker process
+def run_report_job(argv, cwd):
+    """Return the report files, finding count and when the job started and finished (epoch seconds)"""
+    import time
+
+    started = time.time()
+    # Each worker runs one job at a time, so the job can run from the client's directory
+    os.chdir(cwd)
+    args = check_sysarg(argv, JobArgumentParser)
+    for flag, value in (("--batch", args.batch), ("--query-rule", args.query_rule), ("--serve", args.serve),
+                        ("--server-stats", args.server_stats)):
+        if value:
+            raise ValueError(f"{flag} cannot be used in a report server job")
+
+    project_name = report_project_name(args)
+    filename = args.filename or generate_default_output_path(project_name)
+    findings = build_report(args.path, project_name, filename, args, show_progress=False)
+    return {'project': project_name, 'findings': findings, 'started': started, 'finished': time.time(),
+            'reports': [os.path.abspath(output) for output in report_outputs(filename, args.format)]}
+
+# TCP hosts a report server may use: its jobs write files as the server user, so it must not be reachable remotely
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+# Split a server address into a socket family and address: HOST:PORT (or PORT) is TCP, anything else a Unix socket
+def parse_server_address(address):
+    import socket
+
+    match = re.fullmatch(r'(?:(\[[0-9a-fA-F:]+\]|[\w.-]+):)?(\d+)', address)
+    if not match:
+        return socket.AF_UNIX, address
+    host = (match.group(1) or "127.0.0.1").strip("[]")
+    if host not in LOOPBACK_HOSTS:
+        raise ValueError(f"report servers only use loopback addresses ({', '.join(LOOPBACK_HOSTS)}), not {host}")
+    return socket.AF_INET6 if host == "::1" else socket.AF_INET, (host, int(match.group(2)))
+
+class ReportServer:
+    """Long-running report generator that takes jobs over a local socket.
+
+    Every connection sends JSON requests, one per line, and gets one JSON
+    response line for each: {"op": "report", "argv": [...], "cwd": ...} runs
+    generate.py with those arguments, {"op": "stats"} returns the counters.
+    Reports are generated by a fixed pool of worker processes that keep fpdf,
+    the fonts, the word width caches and the semgrep version loaded between
+    jobs. At most `queue_size` jobs wait behind the running ones; further
+    requests are turned away.
+    """
+    # Finished jobs the latency statistics and the recent job list are computed over
+    LATENCY_WINDOW = 1000
+    RECENT_JOBS = 20
+
+    def __init__(self, workers=None, queue_size=64):
+        import time
+        from collections import deque
+
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.queue_size = queue_size
+        self.slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.recent = deque(maxlen=self.RECENT_JOBS)
+        self.started = time.time()
+        self.executor = None
+
+    def start_workers(self):
+        from concurrent.futures import ProcessPoolExecutor, wait
+
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_report_worker)
+        # Start every worker now rather than on the first jobs, so no report pays the start-up
+        wait([self.executor.submit(os.getpid) for _ in range(self.workers)])
+
+    def submit(self, argv, cwd):
+        import time
+        from concurrent.futures.process import BrokenProcessPool
+
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            return {'ok': False, 'error': f"server busy: {self.workers} reports running and {self.queue_size} queued"}
+
+        submitted = time.time()
+        with self.lock:
+            self.in_flight += 1
+        try:
+            executor = self.executor
+            try:
+                result = executor.submit(run_report_job, argv, cwd).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); later jobs get a fresh pool
+                with self.lock:
+                    if self.executor is executor:
+                        executor.shutdown(wait=False)
+                        self.start_workers()
+                raise RuntimeError("a report worker exited unexpectedly; the worker pool was restarted")
+        except Exception as e:
+            response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        else:
+            response = {'ok': True, 'project': result['project'], 'reports': result['reports'],
+                        'findings': result['findings'],
+                        'queued_seconds': round(result['started'] - submitted, 3),
+                        'run_seconds': round(result['finished'] - result['started'], 3)}
+        finally:
+            self.slots.release()
+
+        response['seconds'] = round(time.time() - submitted, 3)
+        with self.lock:
+            self.in_flight -= 1
+            if response['ok']:
+                self.completed += 1
+                self.latencies.append(response['seconds'])
+            else:
+                self.failed += 1
+            self.recent.append(response)
+        return response
+
+    def stats(self):
+        import time
+
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                'uptime_seconds': round(time.time() - self.started, 1),
+                'workers': self.workers,
+                'queue_limit': self.queue_size,
+                # The pool takes jobs in order, so every worker is busy before a job waits
+                'running': min(self.in_flight, self.workers),
+                'queue_depth': max(self.in_flight - self.workers, 0),
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'recent_jobs': list(self.recent),
+            }
+        if latencies:
+            stats['latency_seconds'] = {
+                'count': len(latencies),
+                'mean': round(sum(latencies) / len(latencies), 3),
+                'p50': latencies[len(latencies) // 2],
+                'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                'max': latencies[-1],
+            }
+        return stats
+
+    def handle(self, request):
+        op = request.get('op') if isinstance(request, dict) else None
+        if op == "report":
+            if not isinstance(request.get('argv'), list) or not isinstance(request.get('cwd'), str):
+                return {'ok': False, 'error': "a report request needs 'argv' (list) and 'cwd'"}
+            return self.submit([str(arg) for arg in request['argv']], request['cwd'])
+        if op == "stats":
+            return {'ok': True, **self.stats()}
+        return {'ok': False, 'error': f"unknown op {op!r}, expected 'report' or 'stats'"}
+
+    def serve(self, address):
+        import signal
+        import socket
+        import socketserver
+        import stat
+
+        family, bind_address = parse_server_address(address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            # A socket file left behind by a server that is no longer running is replaced; anything else is kept
+            if not stat.S_ISSOCK(os.stat(address).st_mode):
+                raise RuntimeError(f"{address} exists and is not a socket; refusing to replace it")
+            try:
+                send_server_request(address, {'op': 'stats'})
+            except OSError:
+                os.unlink(address)
+            else:
+                raise RuntimeError(f"A report server is already listening on {address}")
+
+        report_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        response = {'ok': False, 'error': "requests are JSON objects, one per line"}
+                    else:
+                        response = report_server.handle(request)
+                    self.wfile.write((json.dumps(response) + "\n").encode())
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingUnixStreamServer if family == socket.AF_UNIX
+                     else socketserver.ThreadingTCPServer):
+            address_family = family
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.start_workers()
+        server = Server(bind_address, Handler)
+        # Stop cleanly (and remove the socket file) on SIGTERM as on Ctrl+C
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print(f"Report server listening on {address} with {self.workers} workers (queue: {self.queue_size})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if family == socket.AF_UNIX and os.path.exists(address):
+                os.unlink(address)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+# Send one request to a report server and return its response
+def send_server_request(address, request):
+    import socket
+
+    family, connect_address = parse_server_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(connect_address)
+        with connection.makefile('rwb') as stream:
+            stream.write((json.dumps(request) + "\n").encode())
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise OSError(f"The report server at {address} closed the connection")
+    return json.loads(line)
+
+# Command line arguments without --submit and its address, as sent to the server
+def arguments_without_submit(argv):
+    arguments = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == "--submit":
+            skip = True
+        elif not arg.startswith("--submit="):
+            arguments.append(arg)
+    return arguments
+
+if __name__ == "__main__":
+    # Failures the user can fix (missing tools or files, bad refs, unknown projects, no server)
+    # are reported without a traceback
+    try:
+        args = check_sysarg()
+        if args.query_rule:
+            print_rule_locations(args.db, args.query_rule)
+            sys.exit(0)
+        if args.serve:
+            ReportServer(args.serve_workers, args.serve_queue).serve(args.serve)
+            sys.exit(0)
+        if args.server_stats:
+            print(json.dumps(send_server_request(args.server_stats, {'op': 'stats'}), indent=2))
+            sys.exit(0)
+        if args.submit:
+            response = send_server_request(args.submit, {'op': 'report', 'argv': arguments_without_submit(sys.argv[1:]),
+                                                         'cwd': os.getcwd()})
+            if not response['ok']:
+                print(f"Error: {response['error']}")
+                sys.exit(1)
+            print(f"{response['findings']} findings in {response['seconds']:.2f}s "
+                  f"({response['queued_seconds']:.2f}s queued, {response['run_seconds']:.2f}s generating)")
+            for report in response['reports']:
+                print(f"Report written to {report}")
+            sys.exit(0)
+        if args.batch:
+            run_batch(args.batch, args, args.workers)
+            sys.exit(0)
+
+        path, filename = args.path, args.filename
+
+        # Extract project name from path
+        project_name = report_project_name(args)
+        if args.from_db:
+            print(f"Loading recorded findings for project: {project_name}")
+        elif args.input:
+            print(f"Loading saved scan results for project: {project_name}")
+        else:
+            print(f"Scanning project: {project_name}")
+
+        # Generate default output path if none provided
+        if filename is None:
+            filename = generate_default_output_path(project_name)
+            print(f"Output will be saved to: {', '.join(report_outputs(filename, args.format))}")
+
+        build_report(path, project_name, filename, args)
+    except (RuntimeError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,49 @@
+"""Line breaking of measured words, shared by the PDF renderer and the command line options"""
+
+# Index of the first word of every line when words of the given widths are set
+# greedily: each line takes as many words as fit. O(n). With max_lines, it stops at
+# the first word after that many lines, which is returned as one extra start.
+def break_lines_greedy(widths, line_width, space_width, max_lines=None):
+    starts = [0]
+    current = widths[0]
+    for i in range(1, len(widths)):
+        width = widths[i]
+        if current + space_width + width <= line_width:
+            current += space_width + width
+            continue
+        starts.append(i)
+        if max_lines is not None and len(starts) > max_lines:
+            break
+        current = width
+    return starts
+
+# Minimum raggedness: least sum of squared trailing space over every line but the last.
+# Words are never wider than a line here, so each step only looks one line ahead: O(n * words per line).
+def break_lines_balanced(widths, line_width, space_width):
+    count = len(widths)
+    cost = [0.0] * (count + 1)
+    next_start = [count] * (count + 1)
+    for i in range(count - 1, -1, -1):
+        best = None
+        width = -space_width
+        for j in range(i, count):
+            width += space_width + widths[j]
+            if width > line_width and j > i:
+                break
+            total = (0.0 if j == count - 1 else (line_width - width) ** 2) + cost[j + 1]
+            if best is None or total < best:
+                best = total
+                next_start[i] = j + 1
+        cost[i] = best
+
+    starts = []
+    i = 0
+    while i < count:
+        starts.append(i)
+        i = next_start[i]
+    return starts
+
+LINE_BREAKERS = {
+    "greedy": break_lines_greedy,
+    "balanced": break_lines_balanced,
+}
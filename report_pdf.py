@@ -0,0 +1,778 @@
+"""The report document: fpdf.FPDF with font-metric text wrapping, finding tables and page streaming.
+
+Importing fpdf costs about as much as the rest of startup, so generate.py
+imports this module only where a document is created; --help, argument
+errors and database queries never load it.
+"""
+import zlib
+from datetime import datetime
+
+from fpdf import FPDF
+
+from line_breaking import LINE_BREAKERS, break_lines_greedy
+
+# Fill colors of the Severity Level row
+SEVERITY_FILL_COLORS = {
+    "High": (255, 204, 204),
+    "Medium": (255, 255, 204),
+    "Low": (204, 255, 204),
+}
+
+class FindingLayout:
+    """Wrapped lines and heights of every table row of one finding"""
+
+    def __init__(self, rows, spacing=15):
+        # rows: (label, lines, height, fill_color) in drawing order
+        self.rows = rows
+        self.height = sum(row[2] for row in rows) + spacing  # Spacing between findings
+
+class FileBuffer:
+    """Append-only stand-in for FPDF.buffer that writes straight to a file.
+
+    fpdf assembles the document with `self.buffer += line` and takes object
+    offsets from len(self.buffer). Both keep working, but only the byte count
+    stays in memory and appending no longer copies the whole document.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.length = 0
+
+    def __iadd__(self, text):
+        # fpdf keeps binary data as latin-1 strings, one character per byte
+        data = text.encode("latin1")
+        self.file.write(data)
+        self.length += len(data)
+        return self
+
+    def __len__(self):
+        return self.length
+
+class PDF(FPDF):
+    # Word widths are shared by all reports; wrapped text is cached per document
+    WORD_WIDTH_CACHE_SIZE = 100000
+    WRAP_CACHE_SIZE = 10000
+    _word_widths = {}  # font -> {word: width}
+    # Line breaking of wrapped cells (see LINE_BREAKERS); set from --line-breaking
+    line_breaking = "greedy"
+    # Draw the header and footer once as form XObjects that every page references; set from --compact
+    compact = False
+    # Findings drawn between two calls of the progress callback
+    PROGRESS_STEP = 64
+    REPORT_FONT_STYLES = ('B', '', 'I')
+
+    def __init__(self, progress=None):
+        # Pages already written to the output file by stream_to(), or None when the document is kept in memory
+        self.streamed_pages = None
+        super().__init__()
+        # Every footer of a report shows the same time
+        self.generation_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._wrap_cache = {}
+        self._cell_cache = {}
+        # Content of the page chrome drawn by draw_chrome(), and its object number once written
+        self.forms = {}
+        self.form_objects = {}
+        # Called with the number of findings drawn since the last call (see render_progress)
+        self.progress = progress
+        # Register the report fonts in a fixed order so every instance numbers them the same
+        # way, which lets pages rendered by another instance be appended (see append_pages)
+        for style in self.REPORT_FONT_STYLES:
+            self.set_font('Arial', style)
+        self.font_family = ''
+        # Set proper page margins
+        self.set_margins(20, 20, 20)  # Left, Top, Right margins
+        self.set_auto_page_break(auto=True, margin=25)  # Bottom margin
+    
+    # Draw decoration that is identical on every page, as a reference to a shared form XObject in compact mode
+    def draw_chrome(self, name, draw):
+        """Run draw() and, in compact mode, replace what it drew with `/name Do`.
+
+        draw() still runs on every page so position, fonts and colors end up
+        exactly as if it had drawn; the operators that set them are repeated
+        after the reference, since a form doesn't change the page's state.
+        The first page's operators become the form.
+        """
+        if not self.compact:
+            return draw()
+
+        start = len(self.pages[self.page])
+        line_width = self.line_width
+        # Select the fonts inside the form even when they are already active on this page
+        self.font_family = ''
+        draw()
+        content = self.pages[self.page][start:]
+        if self.forms.setdefault(name, content) != content:
+            # Drawn differently than on the first page: keep it on the page
+            return
+
+        operators = ['/%s Do' % name, self.draw_color, self.fill_color]
+        if self.line_width != line_width:
+            operators.append('%.2f w' % (self.line_width * self.k))
+        if self.font_family:
+            operators.append('BT /F%d %.2f Tf ET' % (self.current_font['i'], self.font_size_pt))
+        self.pages[self.page] = self.pages[self.page][:start] + '\n'.join(operators) + '\n'
+
+    def header(self):
+        self.draw_chrome('Header', self.draw_header)
+
+    def draw_header(self):
+        # Set background color for header
+        self.set_fill_color(240, 240, 240)
+        self.rect(0, 0, self.w, 25, 'F')
+        
+        # Company/Project title
+        self.set_font('Arial', 'B', size=12)
+        self.set_text_color(50, 50, 50)
+        self.cell(0, 10, 'Static Application Security Testing Report', 0, 0, 'C')
+        
+        # Subtitle
+        self.set_font('Arial', '', size=8)
+        self.set_text_color(100, 100, 100)
+        self.cell(0, 10, 'Generated by Semgrep CLI', 0, 0, 'C')
+        
+        # Line break
+        self.ln(20)
+
+    def footer(self):
+        self.draw_chrome('Footer', self.draw_footer)
+
+        # Right side - Page number
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'R')
+
+    # Everything in the footer but the page number
+    def draw_footer(self):
+        # Position at 1.5 cm from bottom
+        self.set_y(-15)
+        # Set footer background
+        self.set_fill_color(240, 240, 240)
+        self.rect(0, self.h-15, self.w, 15, 'F')
+        
+        # Page number and generation info
+        self.set_font('Arial', '', size=8)
+        self.set_text_color(100, 100, 100)
+        
+        # Left side - Generation timestamp
+        self.cell(0, 10, f'Generated: {self.get_generation_time()}', 0, 0, 'L')
+
+    def append_pages(self, pages, y):
+        """Append finished pages rendered by another PDF instance (see render_shard).
+
+        Every page gets its footer here, so page numbers follow on from the
+        pages already in this document. The last appended page stays open at
+        height `y` and gets its footer from the next add_page(), like any page.
+        """
+        for content in pages:
+            self.in_footer = 1
+            self.footer()
+            self.in_footer = 0
+            self.page += 1
+            self.pages[self.page] = content
+            # The appended content changed the font behind fpdf's back; force the next set_font
+            self.font_family = ''
+        self.y = y
+        if self.streamed_pages is not None:
+            self.flush_pages(self.page - 1)
+
+    # Write the document to `filename` while it is rendered instead of at output()
+    def stream_to(self, filename):
+        """Finished pages are written and dropped from memory as soon as the next page starts.
+
+        Must be called before the first page. Object numbers and offsets are
+        the ones fpdf would have used; the page tree, fonts and cross-reference
+        table are written by output() at the end. Pages carry no links.
+        """
+        self.buffer = FileBuffer(open(filename, 'wb'))
+        self._putheader()
+        self.streamed_pages = 0
+
+    # Write pages up to `last` to the output file and free their content
+    def flush_pages(self, last):
+        state = self.state
+        # fpdf's _out() writes to the open page while state is 2
+        self.state = 1
+        for n in range(self.streamed_pages + 1, last + 1):
+            self._putpage(n)
+            self.pages[n] = ''
+        self.streamed_pages = max(self.streamed_pages, last)
+        self.state = state
+
+    # Size of the default orientation in points, as FPDF._putpages() computes it
+    def page_size_pt(self):
+        return (self.fw_pt, self.fh_pt) if self.def_orientation == 'P' else (self.fh_pt, self.fw_pt)
+
+    # Page object and content stream of page n, as written by FPDF._putpages()
+    def _putpage(self, n):
+        self._newobj()
+        self._out('<</Type /Page')
+        self._out('/Parent 1 0 R')
+        if n in self.orientation_changes:
+            w_pt, h_pt = self.page_size_pt()
+            self._out('/MediaBox [0 0 %.2f %.2f]' % (h_pt, w_pt))
+        self._out('/Resources 2 0 R')
+        if self.pdf_version > '1.3':
+            self._out('/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>')
+        self._out('/Contents ' + str(self.n + 1) + ' 0 R>>')
+        self._out('endobj')
+
+        content = self.pages[n].encode("latin1")
+        if self.compress:
+            content = zlib.compress(content)
+        self._newobj()
+        self._out('<<' + ('/Filter /FlateDecode ' if self.compress else '') + '/Length ' + str(len(content)) + '>>')
+        self._putstream(content)
+        self._out('endobj')
+
+    def _endpage(self):
+        super()._endpage()
+        if self.streamed_pages is not None:
+            self.flush_pages(self.page)
+
+    # Form XObjects of the page chrome, written with the images so the resource dictionary can list them
+    def _putimages(self):
+        super()._putimages()
+        w_pt, h_pt = self.page_size_pt()
+        for name, content in self.forms.items():
+            content = content.encode("latin1")
+            if self.compress:
+                content = zlib.compress(content)
+            self._newobj()
+            self.form_objects[name] = self.n
+            self._out('<</Type /XObject /Subtype /Form /BBox [0 0 %.2f %.2f] /Resources 2 0 R' % (w_pt, h_pt))
+            self._out(('/Filter /FlateDecode ' if self.compress else '') + '/Length ' + str(len(content)) + '>>')
+            self._putstream(content)
+            self._out('endobj')
+
+    def _putxobjectdict(self):
+        super()._putxobjectdict()
+        for name, n in self.form_objects.items():
+            self._out('/%s %d 0 R' % (name, n))
+
+    def _putheader(self):
+        # A streamed document got its header in stream_to()
+        if self.streamed_pages is None:
+            super()._putheader()
+
+    def _putpages(self):
+        if self.streamed_pages is None:
+            return super()._putpages()
+
+        # Every page is written already; only the page tree is left
+        self.flush_pages(self.page)
+        w_pt, h_pt = self.page_size_pt()
+        self.offsets[1] = len(self.buffer)
+        self._out('1 0 obj')
+        self._out('<</Type /Pages')
+        self._out('/Kids [' + ''.join(str(3 + 2 * i) + ' 0 R ' for i in range(self.page)) + ']')
+        self._out('/Count ' + str(self.page))
+        self._out('/MediaBox [0 0 %.2f %.2f]' % (w_pt, h_pt))
+        self._out('>>')
+        self._out('endobj')
+
+    def output(self, name='', dest=''):
+        if self.streamed_pages is None:
+            return super().output(name, dest)
+        # The document is already in the file given to stream_to()
+        if self.state < 3:
+            self.close()
+        self.close_stream()
+        return ''
+
+    # Close the file given to stream_to(), whether or not the document was finished
+    def close_stream(self):
+        self.buffer.file.close()
+
+    def get_generation_time(self):
+        """Get the report's timestamp for the footer"""
+        return self.generation_time
+
+    # Clean latin-1
+    def clean_text(self, text):
+        return text.encode("latin-1", "ignore").decode("latin-1")
+
+    # Handle long text by truncating if necessary
+    def truncate_text(self, text, max_length=150):
+        if len(text) <= max_length:
+            return text
+        return text[:max_length-3] + "..."
+
+    # Widths of the current font's words, shared by all documents
+    def font_word_widths(self):
+        key = (self.font_family, self.font_style, self.font_size_pt)
+        widths = PDF._word_widths.get(key)
+        if widths is None or len(widths) >= PDF.WORD_WIDTH_CACHE_SIZE:
+            widths = PDF._word_widths[key] = {}
+        return widths
+
+    # Width of a single word in the current font, memoized per (font, size, word)
+    def get_word_width(self, word):
+        widths = self.font_word_widths()
+        width = widths.get(word)
+        if width is None:
+            cw = self.current_font['cw']
+            width = widths[word] = sum(cw.get(char, 0) for char in word) * self.font_size / 1000.0
+        return width
+
+    # Widths of a list of words in the current font, looked up in one pass
+    def measure_words(self, words):
+        widths = self.font_word_widths()
+        cw = self.current_font['cw']
+        scale = self.font_size / 1000.0
+        measured = []
+        for word in words:
+            width = widths.get(word)
+            if width is None:
+                width = widths[word] = sum(cw.get(char, 0) for char in word) * scale
+            measured.append(width)
+        return measured
+
+    # Width of a line of text, built from the cached word widths
+    def get_text_width(self, text):
+        words = text.split(' ')
+        return sum(self.measure_words(words)) + (len(words) - 1) * self.get_word_width(' ')
+
+    # Check whether text fits on one line of a cell of the given width
+    def text_fits(self, text, max_width):
+        return self.get_text_width(text) <= max_width - 2 * self.c_margin
+
+    # Break a word that is wider than a line, preferring hyphens and underscores
+    def split_long_word(self, word, line_width):
+        pieces = []
+        for separator in ('-', '_'):
+            if separator in word.strip(separator):
+                parts = word.split(separator)
+                pieces = [parts[0]] + [separator + part for part in parts[1:]]
+                break
+        else:
+            pieces = [word]
+
+        # Widths add up character by character (core fonts have no kerning), so the
+        # current line's width is carried along instead of measuring it again
+        cw = self.current_font['cw']
+        scale = self.font_size / 1000.0
+        lines = []
+        current = []
+        current_units = 0
+        for piece in pieces:
+            piece_units = sum(cw.get(char, 0) for char in piece)
+            if current and (current_units + piece_units) * scale <= line_width:
+                current.append(piece)
+                current_units += piece_units
+                continue
+            if current:
+                lines.append(''.join(current))
+            current = []
+            current_units = 0
+            # Pieces that still don't fit are cut into character chunks
+            for char in piece:
+                char_units = cw.get(char, 0)
+                if current and (current_units + char_units) * scale > line_width:
+                    lines.append(''.join(current))
+                    current = []
+                    current_units = 0
+                current.append(char)
+                current_units += char_units
+        if current:
+            lines.append(''.join(current))
+        return lines
+
+    # Wrap text into lines that fit a cell of the given width using the real font metrics
+    def wrap_text(self, text, max_width, max_lines=None, line_breaking=None):
+        """Return the lines text occupies in a cell of max_width, memoized per font and width.
+
+        With max_lines, wrapping stops once that many lines are known (greedy only).
+        """
+        line_breaking = line_breaking or self.line_breaking
+        key = (self.font_family, self.font_style, self.font_size_pt, max_width, max_lines, line_breaking, text)
+        lines = self._wrap_cache.get(key)
+        if lines is not None:
+            return lines
+
+        # Text starts c_margin inside the cell on both sides, as in FPDF.cell()
+        line_width = max_width - 2 * self.c_margin
+        space_width = self.get_word_width(' ')
+        break_lines = LINE_BREAKERS[line_breaking]
+        greedy = line_breaking == "greedy"
+        lines = []
+
+        def set_words(words, widths):
+            # Break a run of words that all fit a line and append the resulting lines
+            left = None if max_lines is None else max_lines - len(lines)
+            if greedy:
+                starts = break_lines_greedy(widths, line_width, space_width, left)
+            else:
+                starts = break_lines(widths, line_width, space_width)
+            ends = starts[1:] + [len(words)]
+            lines.extend(' '.join(words[start:end]) for start, end in list(zip(starts, ends))[:left])
+
+        for paragraph in text.split('\n'):
+            words = paragraph.split()
+            widths = self.measure_words(words)
+            run_start = 0
+            # Words wider than a line are split; their pieces end the run of words before them
+            for i, width in enumerate(widths):
+                if width <= line_width:
+                    continue
+                pieces = self.split_long_word(words[i], line_width)
+                if i > run_start:
+                    set_words(words[run_start:i], widths[run_start:i])
+                lines.extend(pieces[:-1])
+                words[i] = pieces[-1]
+                widths[i] = self.get_word_width(pieces[-1])
+                run_start = i
+                if max_lines is not None and len(lines) >= max_lines:
+                    break
+            if run_start < len(words) and (max_lines is None or len(lines) < max_lines):
+                set_words(words[run_start:], widths[run_start:])
+            elif not words:
+                lines.append('')
+            if max_lines is not None and len(lines) >= max_lines:
+                del lines[max_lines:]
+                break
+
+        if len(self._wrap_cache) >= self.WRAP_CACHE_SIZE:
+            self._wrap_cache.clear()
+        self._wrap_cache[key] = lines
+        return lines
+
+    # Handle long text by truncating based on available height
+    def truncate_text_by_height(self, text, max_width, max_height, line_height=6):  # Changed default from 10 to 6
+        # Calculate how many lines we can fit
+        max_lines = max(int(max_height / line_height), 1)
+        # Wrap with the real font metrics, stopping at the lines that fit
+        return '\n'.join(self.wrap_text(text, max_width, max_lines))
+
+    # Create a smart summary for extremely long descriptions
+    def create_smart_summary(self, text, max_lines=12, chars_per_line=60):  # Increased max_lines from 8 to 12
+        """Create a smart summary for very long descriptions"""
+        if len(text) <= chars_per_line * 2:
+            return text  # Short enough, return as is
+        
+        # Split into sentences for better summary
+        sentences = text.split('. ')
+        if len(sentences) <= 2:
+            # If only 1-2 sentences, just truncate at word boundary
+            words = text.split()
+            summary = ""
+            for word in words:
+                if len(summary + " " + word) <= chars_per_line * max_lines:
+                    summary += " " + word if summary else word
+                else:
+                    break
+            return summary + "..." if len(summary) < len(text) else summary
+        
+        # Take first few sentences that fit within the limit
+        summary = ""
+        for sentence in sentences:
+            if len(summary + sentence + ". ") <= chars_per_line * max_lines:
+                summary += sentence + ". " if summary else sentence + ". "
+            else:
+                break
+        
+        # Clean up and add ellipsis if truncated
+        summary = summary.strip()
+        if len(summary) < len(text):
+            summary += " [Full description available in scan output]"
+        
+        return summary
+
+    # Optimize text layout to better utilize available space
+    def optimize_text_layout(self, text, max_width, line_height=6):
+        """Optimize text layout to minimize unnecessary line breaks and reduce wasted space"""
+        return '\n'.join(self.wrap_text(text, max_width))
+
+    # Specialized method for category text to prevent unnecessary line breaks
+    def optimize_category_text(self, text, max_width, line_height=6):
+        """Optimize category text to prevent line breaks for hyphenated terms"""
+        # For categories, we want to keep hyphenated terms together
+        if '-' not in text:
+            # No hyphens, use normal optimization
+            return self.optimize_text_layout(text, max_width, line_height)
+        
+        # Check if the entire category fits on one line
+        if self.text_fits(text, max_width):
+            return text
+        
+        # It doesn't fit, break at the dots between rule id segments
+        if '.' in text:
+            parts = text.split('.')
+            # Segment widths are measured once and added up, instead of measuring every candidate line
+            widths = [self.get_text_width(part) for part in parts]
+            line_width = max_width - 2 * self.c_margin
+            starts = break_lines_greedy(widths, line_width, self.get_word_width('.'))
+            ends = starts[1:] + [len(parts)]
+            return '.\n'.join('.'.join(parts[start:end]) for start, end in zip(starts, ends))
+        
+        # No dots to break at, fall back to splitting the hyphenated term
+        return '\n'.join(self.wrap_text(text, max_width))
+
+    # Specialized method for Affected Lines to handle code snippets properly
+    def optimize_affected_lines(self, text, max_width, line_height=6):
+        """Optimize Affected Lines to handle code snippets and prevent overflow"""
+        # For code snippets, we need to be more careful about line breaks
+        if '\n' in text:
+            # Multi-line code snippet
+            lines = text.split('\n')
+            optimized_lines = []
+            
+            for line in lines:
+                if self.text_fits(line, max_width):
+                    # Line fits, keep as is
+                    optimized_lines.append(line)
+                else:
+                    # Three lines are enough to tell a very long line from a moderately long one
+                    wrapped = self.wrap_text(line, max_width, 3)
+                    if len(wrapped) > 2:
+                        # Very long line, truncate with ellipsis
+                        optimized_lines.append(wrapped[0] + "...")
+                    else:
+                        # Moderately long line, break at spaces
+                        optimized_lines.extend(wrapped)
+            
+            # Limit to reasonable number of lines to prevent cell overflow
+            if len(optimized_lines) > 4:
+                return '\n'.join(optimized_lines[:4]) + "\n[Additional lines available in scan output]"
+            else:
+                return '\n'.join(optimized_lines)
+        else:
+            # Single line, use normal optimization
+            if self.text_fits(text, max_width):
+                return text
+            else:
+                # Long single line, truncate appropriately
+                return self.wrap_text(text, max_width, 1)[0] + "..."
+
+    # Check if there's enough space on the current page for a table row
+    def check_page_break(self, required_height):
+        # Get current Y position and page height
+        current_y = self.get_y()
+        page_height = self.h
+        margin = 25  # Bottom margin - increased for better spacing
+        
+        # Check if adding the required height would exceed the page
+        if current_y + required_height > page_height - margin:
+            return True  # Need page break
+        return False  # Enough space
+
+    # Check if there's enough space for a section header
+    def check_header_space(self, header_height=15):
+        return self.check_page_break(header_height)
+
+    # Ensure proper table positioning within margins
+    def ensure_table_position(self):
+        # Reset to proper left margin for tables
+        self.set_x(20)
+        # Ensure we have enough space from top
+        if self.get_y() < 40:  # Account for header
+            self.set_y(40)
+
+    # Get available width for content (respecting margins)
+    def get_available_width(self):
+        return self.w - 40  # Page width minus left and right margins
+
+    # Create a table cell with proper vertical alignment
+    def create_aligned_cell(self, width, height, text, border=1, align='C', fill=False):
+        # Calculate vertical center position for the text
+        text_height = 10  # Height of single line text
+        y_offset = (height - text_height) / 2
+        
+        # Store current position
+        current_x = self.get_x()
+        current_y = self.get_y()
+        
+        # Draw the cell border
+        self.cell(width, height, '', border, ln=0, fill=fill)
+        
+        # Position text in the center of the cell
+        self.set_xy(current_x, current_y + y_offset)
+        self.cell(width, text_height, text, 0, align=align, ln=0)
+        
+        # Don't change position - let the calling method control it
+        # This ensures table continuity
+
+    # Create a multi_cell with exact height control
+    def create_exact_height_cell(self, width, height, text, border=1, fill=False):
+        # Store current position
+        current_x = self.get_x()
+        current_y = self.get_y()
+        
+        # Draw the cell border with exact height
+        self.cell(width, height, '', border, ln=0, fill=fill)
+        
+        # Line height matching the height the lines were measured with
+        line_height = 6  # Reduced line height for tighter spacing
+        max_lines = int(height / line_height)
+        
+        # Accept pre-wrapped lines so the text is not wrapped a second time
+        lines = text if isinstance(text, list) else self.wrap_text(text, width)
+        
+        # Write the lines one by one, limited to the exact height
+        self.set_xy(current_x, current_y)
+        for line in lines[:max_lines]:
+            self.cell(width, line_height, line, 0, 2)
+        
+        # Don't change position - let the calling method control it
+        # This ensures table continuity
+
+    # Old code, to write the findings directly not in a table format
+    # def write_findings(self, findings,type):
+    #     if findings:
+    #         self.multi_cell(200, 10, txt= type + " Severity Level")
+    #         for finding in findings:
+    #             self.multi_cell(200, 10, txt="Category: " + self.clean_text(str(finding.category)))
+    #             self.multi_cell(200, 10, txt="Description: " + self.clean_text(str(finding.description))) 
+    #             self.multi_cell(200, 10, txt="Reference: " + self.clean_text(str(finding.reference)))
+    #             self.multi_cell(200, 10, txt="Affected Lines: " + self.clean_text(str(finding.code)))
+    #             self.ln(1)
+
+    # Get the width of the data column of the findings table
+    def get_data_width(self):
+        available_width = self.get_available_width()
+        return available_width - int(available_width * 0.2)
+
+    # Compute the wrapped lines of a table row's data cell once, for measuring and drawing
+    def get_cell_lines(self, text, data):
+        """Return the lines the data column of a table row is drawn with"""
+        self.set_font('Arial', '', 10)
+        data_width = self.get_data_width()
+        key = (text, data, data_width)
+        lines = self._cell_cache.get(key)
+        if lines is not None:
+            return lines
+
+        # Use full text instead of aggressive truncation
+        display_data = str(data)
+        
+        # For descriptions, check if they're extremely long and create smart summaries
+        if text == "Category" and '-' in str(data):
+            # For categories with hyphens, treat them as single units to prevent line breaks
+            display_data = str(data)
+        elif text == "Description" and len(display_data) > 500:  # Very long descriptions
+            display_data = self.create_smart_summary(display_data)
+        elif text == "Reference" and len(display_data) > 300:  # Long references
+            display_data = self.create_smart_summary(display_data, max_lines=4, chars_per_line=60)
+        elif text == "Affected Lines" and len(display_data) > 200:  # Long code snippets
+            # For code, try to show the most relevant part
+            if '\n' in display_data:
+                lines = display_data.split('\n')
+                if len(lines) > 3:
+                    display_data = '\n'.join(lines[:3]) + "\n[Additional lines available in scan output]"
+            else:
+                display_data = display_data[:200] + "..." if len(display_data) > 200 else display_data
+        
+        # Use specialized optimization based on field type
+        if text == "Category":
+            # Use category-specific optimization to prevent line breaks for hyphenated terms
+            display_data = self.optimize_category_text(display_data, data_width)
+        elif text == "Affected Lines":
+            # Use Affected Lines specific optimization to handle code snippets
+            display_data = self.optimize_affected_lines(display_data, data_width)
+        
+        # Final wrap guarantees every line fits the measured cell width
+        lines = self.wrap_text(display_data, data_width)
+
+        if len(self._cell_cache) >= self.WRAP_CACHE_SIZE:
+            self._cell_cache.clear()
+        self._cell_cache[key] = lines
+        return lines
+
+    # Lay out one finding: wrap every row once and compute its height
+    def layout_finding(self, finding, type, line_height=6):
+        """Build the FindingLayout used for both pagination and drawing of a finding"""
+        rows = []
+        for label, data, is_severity in (
+            ("Category", self.clean_text(str(finding.category)), False),
+            ("Description", self.clean_text(str(finding.description)), False),
+            ("Severity Level", type, True),
+            ("Reference", self.clean_text(str(finding.reference)), False),
+            (getattr(finding, 'code_label', "Affected Lines"), self.clean_text(str(finding.code)), False),
+        ):
+            lines = self.get_cell_lines(label, data)
+            fill_color = SEVERITY_FILL_COLORS.get(data, (255, 255, 255)) if is_severity else (255, 255, 255)
+            rows.append((label, lines, len(lines) * line_height, fill_color))
+        return FindingLayout(rows)
+
+    # Draw one table row from its pre-wrapped lines
+    def draw_table_row(self, text, lines, data_height, fill_color=(255, 255, 255)):
+        self.set_font('Arial', '', 10)
+        self.set_fill_color(*fill_color)
+        
+        # Check if we need a page break to keep the table row together
+        if self.check_page_break(data_height):
+            self.add_page()
+        
+        # Ensure we're within page margins
+        current_x = self.get_x()
+        if current_x < 20:  # Left margin
+            self.set_x(20)
+        elif current_x > self.w - 200:  # Right margin (table width is 200)
+            self.set_x(20)  # Reset to left margin
+        
+        # Calculate column widths based on available space
+        available_width = self.get_available_width()
+        label_width = int(available_width * 0.2)  # 20% for label
+        data_width = available_width - label_width  # Remaining for data
+        
+        # Store current x position
+        x_pos = self.get_x()
+        y_pos = self.get_y()
+        
+        # First column (label) - use same height as data column and center text vertically
+        self.create_aligned_cell(label_width, data_height, text, border=1, align='C', fill=False)
+        
+        # Second column (data) - use exact height control to match first column
+        self.set_xy(x_pos + label_width, y_pos)
+        self.create_exact_height_cell(data_width, data_height, lines, border=1, fill=True)
+        
+        # Position for next row - both cells now have exactly the same height
+        # Don't use ln() as it breaks table continuity
+        self.set_xy(20, y_pos + data_height)  # Reset to left margin, move down by cell height
+
+    # The function to iterate through the available findings and write to data
+    def write_finding(self, finding, type, layout=None, last=True):
+        # Ensure proper table positioning
+        self.ensure_table_position()
+        
+        # Lay the finding out once; the same layout decides the page break and is drawn
+        if layout is None:
+            layout = self.layout_finding(finding, type)
+        
+        # Check if we need a page break to keep the entire finding together
+        if self.check_page_break(layout.height):
+            self.add_page()
+            self.ensure_table_position()  # Reset position on new page
+        
+        for text, lines, data_height, fill_color in layout.rows:
+            self.draw_table_row(text, lines, data_height, fill_color)
+        
+        # Add spacing between findings while maintaining table structure
+        if not last:
+            # Add space between findings but keep table structure
+            current_y = self.get_y()
+            self.set_xy(20, current_y + 5)  # Small gap between findings
+        else:
+            # Last finding - add final spacing
+            current_y = self.get_y()
+            self.set_xy(20, current_y + 3)
+
+    def write_to_table(self, findings, type, first_layout=None):
+        if findings:
+            # Progress is reported in batches so the callback stays out of the per-finding cost
+            step = self.PROGRESS_STEP
+            for i, finding in enumerate(findings):
+                self.write_finding(finding, type, first_layout if i == 0 else None, last=i == len(findings) - 1)
+
+                if self.progress is not None and (i + 1) % step == 0:
+                    self.progress(step)
+
+            if self.progress is not None and len(findings) % step:
+                self.progress(len(findings) % step)
+
+class ShardPDF(PDF):
+    """Renders part of the findings on pages of its own; footers are drawn when the pages are merged"""
+
+    def footer(self):
+        pass
+
+    def finished_pages(self):
+        """Content of every page and the height reached on the last one, for PDF.append_pages()"""
+        return [self.pages[n] for n in range(1, self.page + 1)], self.get_y()